@@ -52,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its times cover the other middleware
+    'fridge.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,7 +67,8 @@ ROOT_URLCONF = 'askfridge.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates timing renders for fridge.metrics
+        'BACKEND': 'fridge.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,9 +92,20 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # keep connections between requests, seconds
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# applied to every new sqlite connection, see fridge.sqlite_tuning
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -16000,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -130,4 +144,34 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.11/howto/static-files/
 
 STATIC_URL = '/static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'static')
\ No newline at end of file
+STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+
+
+# Scraped recipe and ingredient data
+# recipes can be recipes.json or a directory of jsonl segments
+
+RECIPES_PATH = os.path.join(BASE_DIR, 'recipes.json')
+INGREDIENTS_PATH = os.path.join(BASE_DIR, 'ingredients.json')
+
+
+# Cache of list pages, see fridge.list_cache
+# on disk, so every server process sees the versions bumped by the others,
+# a per process backend like LocMemCache would serve stale pages
+# list versions expire with TIMEOUT too, a lost version only costs a render
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.fridge_cache'),
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+
+# requests slower than this are logged with their slowest queries,
+# see fridge.metrics
+METRICS_SLOW_REQUEST_SECONDS = 0.5
+# bearer token a Prometheus scraper sends for /metrics,
+# without it only staff users can read them
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
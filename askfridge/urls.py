@@ -21,10 +21,13 @@ from fridge import urls as list_urls
 #from django.contrib import admin
 
 from fridge import views
+from fridge.metrics import metrics_view
 
 urlpatterns = [
     #url(r'^admin/', admin.site.urls),
     # homepage url
     url(r'^$', views.home_page, name='home'),
     # import fridge urls and views
-    url(r'^fridge/', include(list_urls)),]
\ No newline at end of file
+    url(r'^fridge/', include(list_urls)),
+    # request histograms in Prometheus text format
+    url(r'^metrics$', metrics_view, name='metrics'),]
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""Corpus load benchmark
+Compare loading the recipe corpus from json with opening a corpus store,
+each in a fresh process, reporting:
+    load time
+    RSS of the process after loading and one recipe lookup
+
+Run with: python -m benchmarks.bench_corpus_store recipes.json ingredients.json
+Or on a synthetic corpus of 50000 recipes:
+    python -m benchmarks.bench_corpus_store --synthetic 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from fridge import corpus_store
+from fridge.corpus import load_ingredients, load_recipes
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in a fresh process, prints load seconds and RSS in KiB
+JSON_LOADER = '''
+import json, resource, sys, time
+start = time.perf_counter()
+with open(sys.argv[1]) as f:
+    recipes = json.load(f)
+recipes[sys.argv[2]]
+seconds = time.perf_counter() - start
+print(seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+STORE_LOADER = '''
+import resource, sys, time
+from fridge.corpus_store import CorpusStore
+start = time.perf_counter()
+store = CorpusStore(sys.argv[1])
+store.find_recipe(sys.argv[2])
+seconds = time.perf_counter() - start
+print(seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+EMPTY = '''
+import resource, sys
+from fridge.corpus_store import CorpusStore
+print(0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+
+def synthetic_recipes(count, ingredients):
+    """Get count recipe records made from catalogue names"""
+    names = [name for names in ingredients.values() for name in names]
+    random.seed(0)
+    return [{'name': f'Recipe {i}',
+             'category': ['Type of dish', f'Category {i % 40}'],
+             'ingredients': [f'{random.randint(1, 8)} oz {random.choice(names)}'
+                             for _ in range(random.randint(5, 15))],
+             'url': f'http://deliaonline.com/recipes/recipe-{i}'}
+            for i in range(count)]
+
+
+def run(loader, *args):
+    """Get (seconds, RSS KiB) from a loader run in a fresh process"""
+    output = subprocess.check_output(
+        [sys.executable, '-c', loader] + list(args), cwd=ROOT_DIR)
+    seconds, rss = output.split()
+    return float(seconds), int(rss)
+
+
+def parse_args():
+    """Get command line options"""
+    parser = argparse.ArgumentParser(description='Benchmark corpus loading')
+    parser.add_argument('recipes', nargs='?', default='recipes.json')
+    parser.add_argument('ingredients', nargs='?', default='ingredients.json')
+    parser.add_argument('--synthetic', type=int,
+                        help='use this many synthetic recipes')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    ingredients = load_ingredients(args.ingredients)
+    if args.synthetic:
+        recipes = synthetic_recipes(args.synthetic, ingredients)
+    else:
+        recipes = load_recipes(args.recipes)
+    name = recipes[len(recipes) // 2]['name']
+    with tempfile.TemporaryDirectory() as work_dir:
+        json_path = os.path.join(work_dir, 'recipes.json')
+        with open(json_path, 'w') as f:
+            json.dump({r['name']: r for r in recipes}, f)
+        store_path = os.path.join(work_dir, 'corpus.bin')
+        corpus_store.convert(recipes, ingredients, store_path)
+        _, base_rss = run(EMPTY)
+        print(f'{len(recipes)} recipes, json {os.path.getsize(json_path)} '
+              f'bytes, store {os.path.getsize(store_path)} bytes')
+        print(f'{"format":<8}{"load ms":>10}{"RSS KiB":>10}')
+        for label, loader, path in (('json', JSON_LOADER, json_path),
+                                    ('store', STORE_LOADER, store_path)):
+            seconds, rss = run(loader, path, name)
+            # RSS above an interpreter that has imported the store module
+            print(f'{label:<8}{seconds * 1000:>10.2f}{rss - base_rss:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Parse benchmark for recipies.py
+Compare the full parse of get_soup with the fast parse
+on saved sample pages, per page:
+    mean parse time
+    peak memory allocated while parsing
+
+Run with: python -m benchmarks.bench_parse [page.html ...]
+Pages default to the samples in benchmarks/pages
+"""
+
+import glob
+import os
+import sys
+import timeit
+import tracemalloc
+
+import recipies
+
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+REPEAT = 50
+
+
+def scrape(soup):
+    """Get what the scraper reads from a soup, to check both parses agree"""
+    if recipies.is_target_data(soup):
+        return recipies.get_target_data(soup)
+    return (recipies.get_categories(soup),
+            recipies.get_number_of_pages(soup))
+
+
+def peak_memory(content, fast):
+    """Get peak memory in bytes allocated while parsing a page"""
+    tracemalloc.start()
+    soup = recipies.parse_page(content, fast)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del soup
+    return peak
+
+
+def bench_page(path):
+    """Time and measure both parses of a page"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    if scrape(recipies.parse_page(content)) != \
+            scrape(recipies.parse_page(content, True)):
+        print(f'{path}: fast parse scrapes different data')
+    results = {}
+    for name, fast in (('full', False), ('fast', True)):
+        seconds = timeit.timeit(
+            lambda: recipies.parse_page(content, fast), number=REPEAT)
+        results[name] = (seconds / REPEAT, peak_memory(content, fast))
+    return results
+
+
+def main(paths):
+    print(f'fast parser: {recipies.get_fast_parser()}')
+    print(f'{"page":<20}{"parse":>6}{"ms/page":>10}{"peak KiB":>10}')
+    for path in paths:
+        results = bench_page(path)
+        for name, (seconds, peak) in results.items():
+            print(f'{os.path.basename(path):<20}{name:>6}'
+                  f'{seconds * 1000:>10.2f}{peak / 1024:>10.0f}')
+        speedup = results['full'][0] / results['fast'][0]
+        print(f'{"":<20}{"x":>6}{speedup:>10.1f}'
+              f'{results["full"][1] / results["fast"][1]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or sorted(glob.glob(os.path.join(PAGES_DIR, '*.html'))))
@@ -0,0 +1,120 @@
+"""Crawler throughput benchmark for recipies.py and ingredients.py
+Each scraper is run against a replay server serving a recorded archive,
+so runs are reproducible on a machine with no network.
+For each run reports:
+    pages per second
+    total wall time
+    peak RSS of the scraper process
+
+Record an archive once with network:
+    SCRAPE_RECORD_DIR=archive python recipies.py
+    SCRAPE_RECORD_DIR=archive python ingredients.py
+Then run with: python -m benchmarks.bench_scrapers archive
+    --latency 0.05 --error-rate 0.01
+    --recipes-args="--concurrent --workers 16" --json results.json
+"""
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from replay import Archive, ReplayServer
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scraper_command(scraper, work_dir, extra_args):
+    """Get command line to run a scraper writing into work_dir"""
+    if scraper == 'recipies':
+        args = ['--output', os.path.join(work_dir, 'recipes'),
+                '--state', os.path.join(work_dir, 'crawl_state.json')]
+    else:
+        args = ['--output', os.path.join(work_dir, 'ingredients.json')]
+    return [sys.executable, f'{scraper}.py'] + args + shlex.split(extra_args)
+
+
+def run_scraper(server, scraper, extra_args):
+    """Run a scraper against the replay server and measure it"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ,
+                   SCRAPE_REPLAY_URL=server.url,
+                   # empty cache so every page is downloaded
+                   SCRAPE_CACHE_DIR=os.path.join(work_dir, 'cache'))
+        env.pop('SCRAPE_RECORD_DIR', None)
+        requests_before = server.stats['requests']
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            scraper_command(scraper, work_dir, extra_args), cwd=ROOT_DIR,
+            env=env, stdout=subprocess.DEVNULL)
+        # wait4 gives the resource usage of this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+    pages = server.stats['requests'] - requests_before
+    return {
+        'scraper': scraper,
+        'args': extra_args,
+        'exit_status': status,
+        'pages': pages,
+        'seconds': round(seconds, 3),
+        'pages_per_second': round(pages / seconds, 1),
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mib': round(usage.ru_maxrss / 1024, 1),
+    }
+
+
+def parse_args():
+    """Get command line options"""
+    parser = argparse.ArgumentParser(description='Benchmark the scrapers')
+    parser.add_argument('archive', help='directory of recorded pages')
+    parser.add_argument('--scrapers', nargs='+',
+                        default=['recipies', 'ingredients'],
+                        choices=['recipies', 'ingredients'])
+    parser.add_argument('--recipes-args', default='',
+                        help='extra arguments for recipies.py')
+    parser.add_argument('--ingredients-args', default='',
+                        help='extra arguments for ingredients.py')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='up to this many random seconds added')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for reproducible jitter and errors')
+    parser.add_argument('--json', help='file to save results to')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = ReplayServer(Archive(args.archive), latency=args.latency,
+                          jitter=args.jitter, error_rate=args.error_rate,
+                          seed=args.seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    extra_args = {'recipies': args.recipes_args,
+                  'ingredients': args.ingredients_args}
+    results = []
+    print(f'{"scraper":<14}{"pages":>8}{"seconds":>10}'
+          f'{"pages/s":>10}{"RSS MiB":>10}')
+    for scraper in args.scrapers:
+        result = run_scraper(server, scraper, extra_args[scraper])
+        results.append(result)
+        print(f'{scraper:<14}{result["pages"]:>8}{result["seconds"]:>10}'
+              f'{result["pages_per_second"]:>10}{result["peak_rss_mib"]:>10}')
+    server.shutdown()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'latency': args.latency, 'jitter': args.jitter,
+                       'error_rate': args.error_rate, 'results': results},
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""SQLite concurrency benchmark
+Several worker processes read list pages and add items through the ORM
+against one database file, first with sqlite defaults then with
+settings.SQLITE_PRAGMAS, reporting:
+    reads and writes per second over all workers
+    writes that failed with "database is locked"
+
+Run with: python -m benchmarks.bench_sqlite --workers 8 --seconds 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connections
+
+
+LISTS = 100
+ITEMS_PER_LIST = 200
+
+
+def setup_database(path, pragmas):
+    """Migrate and seed a new database file with the given pragmas
+    Return list ids
+    """
+    from fridge.models import Item, List
+    settings.DATABASES['default']['NAME'] = path
+    settings.SQLITE_PRAGMAS = pragmas
+    call_command('migrate', verbosity=0)
+    List.objects.bulk_create(List() for _ in range(LISTS))
+    list_ids = list(List.objects.values_list('id', flat=True))
+    Item.objects.bulk_create(Item(text=f'item {i}', list_id=list_id)
+                             for list_id in list_ids
+                             for i in range(ITEMS_PER_LIST))
+    # workers must open their own connections
+    connections.close_all()
+    return list_ids
+
+
+def worker(args):
+    """Run reads and writes until the deadline
+    Return (reads, writes, locked writes)
+    """
+    from fridge.models import Item
+    list_ids, deadline, write_ratio, seed = args
+    rng = random.Random(seed)
+    reads = writes = locked = 0
+    while time.time() < deadline:
+        list_id = rng.choice(list_ids)
+        if rng.random() < write_ratio:
+            try:
+                Item.objects.create(text='new item', list_id=list_id)
+                writes += 1
+            except OperationalError:
+                locked += 1
+        else:
+            list(Item.objects.filter(list_id=list_id).order_by('id')[:100])
+            reads += 1
+    connections.close_all()
+    return reads, writes, locked
+
+
+def run(label, pragmas, args, work_dir):
+    """Benchmark one pragma setting and print its throughput"""
+    path = os.path.join(work_dir, f'{label}.sqlite3')
+    list_ids = setup_database(path, pragmas)
+    deadline = time.time() + args.seconds
+    jobs = [(list_ids, deadline, args.write_ratio, seed)
+            for seed in range(args.workers)]
+    with multiprocessing.Pool(args.workers) as pool:
+        results = pool.map(worker, jobs)
+    reads, writes, locked = (sum(column) for column in zip(*results))
+    print(f'{label:<10}{reads / args.seconds:>12.0f}'
+          f'{writes / args.seconds:>12.0f}{locked:>10}')
+
+
+def parse_args():
+    """Get command line options"""
+    parser = argparse.ArgumentParser(
+        description='Benchmark concurrent sqlite reads and writes')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2,
+                        help='fraction of operations that add an item')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'askfridge.settings')
+    django.setup()
+    tuned = dict(settings.SQLITE_PRAGMAS)
+    print(f'{args.workers} workers, {args.write_ratio:.0%} writes, '
+          f'{args.seconds:g}s per run')
+    print(f'{"pragmas":<10}{"reads/s":>12}{"writes/s":>12}{"locked":>10}')
+    with tempfile.TemporaryDirectory() as work_dir:
+        run('default', {}, args, work_dir)
+        run('tuned', tuned, args, work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""HTTP load test of the fridge endpoints
+Seeds a new database with synthetic lists, serves the site from a
+threaded WSGI server in this process and drives it with concurrent
+clients, a weighted mix of:
+    home      GET /
+    new       POST /fridge/new
+    list      GET /fridge/<id>/
+    add_item  POST /fridge/<id>/add_item
+For each endpoint reports:
+    requests per second
+    p50, p95 and p99 latency
+    SQL queries per request, counted by the server
+
+Run with: python -m benchmarks.load_fridge --lists 50 --items 500
+    --clients 8 --requests 2000 --json results.json
+Compare runs with and without the list cache using --no-cache.
+"""
+
+import argparse
+import collections
+import http.client
+import json
+import os
+import random
+import socketserver
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer
+from django.db import connection, connections
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ['home', 'new', 'list', 'add_item']
+DEFAULT_MIX = {'home': 10, 'new': 5, 'list': 70, 'add_item': 15}
+
+
+class ThreadedWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def count_queries(application):
+    """Wrap a WSGI application to add an X-Query-Count response header"""
+    def counted(environ, start_response):
+        # connections are per thread, so this counts this request only
+        connection.force_debug_cursor = True
+        connection.queries_log.clear()
+
+        def counting_start_response(status, headers, exc_info=None):
+            headers.append(('X-Query-Count', str(len(connection.queries))))
+            return start_response(status, headers, exc_info)
+        return application(environ, counting_start_response)
+    return counted
+
+
+def seed(path, lists, items):
+    """Migrate and fill a new database, return the list ids"""
+    from fridge.models import Item, List
+    settings.DATABASES['default']['NAME'] = path
+    call_command('migrate', verbosity=0)
+    List.objects.bulk_create(List() for _ in range(lists))
+    list_ids = list(List.objects.values_list('id', flat=True))
+    for list_id in list_ids:
+        Item.objects.bulk_create(Item(text=f'ingredient {i}', list_id=list_id)
+                                 for i in range(items))
+    connections.close_all()
+    return list_ids
+
+
+class Client:
+    """One simulated user with its own csrf cookie"""
+
+    def __init__(self, host, port, list_ids, rng):
+        self.host, self.port = host, port
+        self.list_ids = list_ids
+        self.rng = rng
+        self.csrf_token = None
+
+    def request(self, method, path, data=None):
+        """Make a request, return (status, query count)"""
+        conn = http.client.HTTPConnection(self.host, self.port)
+        headers = {}
+        body = None
+        if self.csrf_token:
+            headers['Cookie'] = f'csrftoken={self.csrf_token}'
+        if data is not None:
+            data = dict(data, csrfmiddlewaretoken=self.csrf_token)
+            body = urllib.parse.urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie', '')
+        if cookie.startswith('csrftoken='):
+            self.csrf_token = cookie.split(';')[0].split('=', 1)[1]
+        conn.close()
+        return response.status, int(response.getheader('X-Query-Count', 0))
+
+    def call(self, endpoint):
+        """Call an endpoint, return (status, query count)"""
+        list_id = self.rng.choice(self.list_ids)
+        if endpoint == 'home':
+            return self.request('GET', '/')
+        if endpoint == 'new':
+            return self.request('POST', '/fridge/new',
+                                {'item_text': 'new list item'})
+        if endpoint == 'list':
+            return self.request('GET', f'/fridge/{list_id}/')
+        return self.request('POST', f'/fridge/{list_id}/add_item',
+                            {'item_text': 'added item'})
+
+
+def percentile(ordered, fraction):
+    """Get the nearest rank percentile of a sorted list"""
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_load(address, list_ids, args):
+    """Send args.requests requests from args.clients threads
+    Return (samples by endpoint, wall seconds)
+    samples are (seconds, status, query count)
+    """
+    endpoints = [e for e in ENDPOINTS if args.mix[e]]
+    weights = [args.mix[e] for e in endpoints]
+    samples = collections.defaultdict(list)
+    lock = threading.Lock()
+    remaining = [args.requests]
+
+    def client_thread(seed):
+        rng = random.Random(seed)
+        client = Client(*address, list_ids, rng)
+        # first visit gets the csrf cookie
+        client.request('GET', '/')
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            endpoint = rng.choices(endpoints, weights)[0]
+            start = time.perf_counter()
+            status, queries = client.call(endpoint)
+            seconds = time.perf_counter() - start
+            with lock:
+                samples[endpoint].append((seconds, status, queries))
+
+    threads = [threading.Thread(target=client_thread,
+                                args=(args.seed * args.clients + i,))
+               for i in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, seconds):
+    """Get result dictionary of each endpoint"""
+    results = {}
+    for endpoint, endpoint_samples in sorted(samples.items()):
+        latencies = sorted(s[0] for s in endpoint_samples)
+        results[endpoint] = {
+            'requests': len(latencies),
+            'errors': sum(1 for s in endpoint_samples if s[1] >= 400),
+            'requests_per_second': round(len(latencies) / seconds, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'queries_per_request': round(
+                sum(s[2] for s in endpoint_samples) / len(latencies), 2),
+        }
+    return results
+
+
+def git_commit():
+    """Get the current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(text):
+    """Get endpoint weights from text like list=70,add_item=30"""
+    mix = dict.fromkeys(ENDPOINTS, 0)
+    for part in text.split(','):
+        endpoint, weight = part.split('=')
+        if endpoint not in mix:
+            raise argparse.ArgumentTypeError(f'unknown endpoint {endpoint}')
+        mix[endpoint] = float(weight)
+    return mix
+
+
+def parse_args():
+    """Get command line options"""
+    parser = argparse.ArgumentParser(
+        description='Load test the fridge endpoints')
+    parser.add_argument('--lists', type=int, default=50,
+                        help='synthetic lists to seed')
+    parser.add_argument('--items', type=int, default=100,
+                        help='items in each seeded list')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='concurrent client threads')
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='total requests to send')
+    parser.add_argument('--mix', type=parse_mix,
+                        default=DEFAULT_MIX,
+                        help='endpoint weights, e.g. list=70,add_item=30')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='run with a dummy cache backend')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='file to save results to')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'askfridge.settings')
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.no_cache:
+            settings.CACHES = {'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        else:
+            # seeded lists reuse the ids of earlier runs, so start empty
+            settings.CACHES = {'default': dict(
+                settings.CACHES['default'],
+                LOCATION=os.path.join(work_dir, 'cache'))}
+        django.setup()
+        from django.core.wsgi import get_wsgi_application
+        list_ids = seed(os.path.join(work_dir, 'load.sqlite3'),
+                        args.lists, args.items)
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+        server.set_app(count_queries(get_wsgi_application()))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        samples, seconds = run_load(server.server_address[:2], list_ids, args)
+        server.shutdown()
+        server.server_close()
+    results = summarize(samples, seconds)
+    total = sum(r['requests'] for r in results.values())
+    print(f'{total} requests in {seconds:.2f}s, '
+          f'{total / seconds:.1f} requests/s')
+    print(f'{"endpoint":<10}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}'
+          f'{"p99 ms":>9}{"queries":>9}{"errors":>8}')
+    for endpoint, r in results.items():
+        print(f'{endpoint:<10}{r["requests_per_second"]:>9}{r["p50_ms"]:>9}'
+              f'{r["p95_ms"]:>9}{r["p99_ms"]:>9}'
+              f'{r["queries_per_request"]:>9}{r["errors"]:>8}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': git_commit(), 'lists': args.lists,
+                       'items': args.items, 'clients': args.clients,
+                       'mix': args.mix, 'cache': not args.no_cache,
+                       'seconds': round(seconds, 3),
+                       'requests_per_second': round(total / seconds, 1),
+                       'endpoints': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
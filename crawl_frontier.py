@@ -0,0 +1,112 @@
+"""Crawl frontier for the scrapers
+Keeps the urls still to crawl and the urls already crawled,
+so every page is fetched once however many pages link to it.
+
+Urls are normalized before they are compared:
+    HTTP://Site.com:80/a/?b=2&a=1#top -> http://site.com/a?a=1&b=2
+
+The frontier is saved to a json state file every few pages,
+so an interrupted crawl can be resumed from the last checkpoint.
+A page that fails stays pending, so resuming the crawl retries it.
+"""
+
+import collections
+import json
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """Get a canonical form of a url"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    # drop default ports
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+    # drop trailing slash but keep root path
+    path = parts.path.rstrip('/') or '/'
+    # sort query so parameter order does not matter
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    # fragment is never sent to the server
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+class Frontier:
+    """Urls waiting to be crawled and urls already crawled
+    Pending urls include pages that are being crawled now,
+    so they are crawled again if the crawl stops before they complete.
+    Each pending url can carry json data, e.g. the path to its page.
+    """
+
+    def __init__(self, state_path=None, checkpoint_every=50):
+        self.state_path = state_path
+        self.checkpoint_every = checkpoint_every
+        # url: data, ordered so a resumed crawl keeps the same order
+        self.pending = collections.OrderedDict()
+        self.done = set()
+        self._since_checkpoint = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, url, data=None):
+        """Add a url to crawl with its data
+        Return normalized url if it is new, None if already seen
+        """
+        url = normalize_url(url)
+        if url in self.pending or url in self.done:
+            return None
+        self.pending[url] = data
+        return url
+
+    def complete(self, url):
+        """Mark a url as crawled and checkpoint every few urls"""
+        self.pending.pop(url, None)
+        self.done.add(url)
+        self._since_checkpoint += 1
+        if self.state_path and self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Save frontier to the state file"""
+        state = {
+            'pending': list(self.pending.items()),
+            'done': sorted(self.done),
+        }
+        # write then rename so a crash never leaves a partial state file
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+        self._since_checkpoint = 0
+
+    def resume(self):
+        """Load frontier from the state file
+        Return True if there was a crawl to resume
+        """
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+        with open(self.state_path) as f:
+            state = json.load(f)
+        self.pending = collections.OrderedDict(state['pending'])
+        self.done = set(state['done'])
+        print(f'Resuming crawl: {len(self.done)} done, '
+              f'{len(self.pending)} pending')
+        return True
+
+    def finish(self):
+        """Remove the state file once the crawl is complete
+        Keep it if pages failed, so resuming the crawl retries them
+        """
+        if not self.state_path:
+            return
+        if self.pending:
+            self.checkpoint()
+            print(f'{len(self.pending)} pages failed, '
+                  f'resume the crawl to retry them')
+        elif os.path.exists(self.state_path):
+            os.remove(self.state_path)
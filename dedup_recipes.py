@@ -0,0 +1,214 @@
+"""Merge duplicate scraped recipes
+deliaonline lists a recipe under several categories. The crawl fetches
+its page once and writes it with the first category path, the path of
+every later link to the page goes to listings.jsonl, see recipe_sink.py.
+The same recipe can also be at another url, or be a near copy.
+
+Duplicates are merged into the first record, which gets the category
+paths of every copy and of every listing of their urls:
+    {'name': ..., 'category': first path, 'categories': [every path],
+     'ingredients': ..., 'url': ...}
+Only recipes with more than one path get 'categories'.
+
+Records with the same url are duplicates. Other candidates are found
+with MinHash signatures of each recipe's normalized ingredient set,
+split into bands, LSH: recipes sharing a whole band land in the same
+bucket, so only recipes in a bucket are compared, not every pair.
+Within a bucket a recipe is only compared with the first recipe of each
+group found so far, at most MAX_REPRESENTATIVES of them.
+A candidate is a duplicate if its ingredient sets are similar enough
+and so are the names, as different recipes can share ingredients.
+
+Run with: python dedup_recipes.py recipes recipes-dedup
+"""
+
+import argparse
+import collections
+import random
+import time
+import zlib
+
+from crawl_frontier import normalize_url
+from recipe_sink import RecipeSink, iter_listings, segment_paths
+
+from fridge.canonical import name_key, tokens
+from fridge.corpus import category_paths, iter_recipes
+from fridge.ingredient_parser import parse_lines
+
+
+# 16 bands of 4 rows find most pairs with ingredient similarity over 0.5
+BANDS = 16
+ROWS = 4
+# Mersenne prime above every 32 bit shingle hash
+PRIME = (1 << 61) - 1
+# least jaccard similarity of ingredients and of names of duplicates
+INGREDIENT_SIMILARITY = 0.8
+NAME_SIMILARITY = 0.5
+# most groups a bucket member is compared with, a bucket of common sets
+# such as {salt, pepper} holds many recipes unlike by name
+MAX_REPRESENTATIVES = 50
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def recipe_path(path, name):
+    """Get the category path of a recipe from the path of a link to it"""
+    # last link text on the path is usually the recipe itself
+    if path and path[-1].strip().lower() == name.strip().lower():
+        return path[:-1]
+    return path
+
+
+def ingredient_set(record, parsed):
+    """Get frozenset of normalized ingredient names of a record"""
+    return frozenset(name_key(parsed[line].name)
+                     for line in record['ingredients']) - {None}
+
+
+class MinHasher:
+    """MinHash signatures of sets of strings"""
+
+    def __init__(self, permutations=BANDS * ROWS, seed=0):
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, PRIME), rng.randrange(PRIME))
+                             for _ in range(permutations)]
+        # hashes of a shingle under every permutation,
+        # ingredient names repeat across recipes
+        self._hashes = {}
+
+    def shingle_hashes(self, shingle):
+        hashes = self._hashes.get(shingle)
+        if hashes is None:
+            x = zlib.crc32(shingle.encode('utf8'))
+            hashes = self._hashes[shingle] = tuple(
+                (a * x + b) % PRIME for a, b in self.permutations)
+        return hashes
+
+    def signature(self, shingles):
+        """Get tuple of the least hash of shingles under each permutation"""
+        return tuple(map(min, zip(*map(self.shingle_hashes, shingles))))
+
+
+class UnionFind:
+    """Groups of record ids, each named by its smallest id"""
+
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        # keep the earliest record as the group's record
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+
+def find_duplicates(records):
+    """Get UnionFind grouping duplicate records by position"""
+    groups = UnionFind(len(records))
+    by_url = {}
+    for i, record in enumerate(records):
+        if record.get('url'):
+            groups.union(by_url.setdefault(normalize_url(record['url']), i),
+                         i)
+
+    lines = [line for record in records for line in record['ingredients']]
+    parsed = dict(zip(lines, parse_lines(lines)))
+    sets = [ingredient_set(record, parsed) for record in records]
+    names = [tokens(record['name']) for record in records]
+    hasher = MinHasher()
+    buckets = collections.defaultdict(list)
+    for i, shingles in enumerate(sets):
+        if not shingles:
+            continue
+        signature = hasher.signature(shingles)
+        for band in range(BANDS):
+            rows = signature[band * ROWS:(band + 1) * ROWS]
+            buckets[band, rows].append(i)
+
+    for members in buckets.values():
+        # a member is compared with the first member of each group
+        # in the bucket, not with every other member, a member unlike
+        # the first group can be like another
+        representatives = []
+        for i in members:
+            for j in representatives:
+                if groups.find(i) == groups.find(j) or (
+                        jaccard(sets[i], sets[j]) >= INGREDIENT_SIMILARITY
+                        and jaccard(names[i], names[j]) >= NAME_SIMILARITY):
+                    groups.union(i, j)
+                    break
+            else:
+                if len(representatives) < MAX_REPRESENTATIVES:
+                    representatives.append(i)
+    return groups
+
+
+def dedup(records, listings=None):
+    """Get list of records with duplicates merged, in crawl order
+    listings is a dictionary of url: paths of later links to the url
+    """
+    listings = listings or {}
+    groups = find_duplicates(records)
+    merged, paths = {}, {}
+    for i, record in enumerate(records):
+        group = groups.find(i)
+        if group not in merged:
+            merged[group] = dict(record)
+            paths[group] = []
+        url = normalize_url(record['url']) if record.get('url') else None
+        for path in category_paths(record) + [
+                recipe_path(path, record['name'])
+                for path in listings.get(url, [])]:
+            if path and path not in paths[group]:
+                paths[group].append(path)
+    for group, record in merged.items():
+        record.pop('categories', None)
+        record['category'] = paths[group][0] if paths[group] else []
+        if len(paths[group]) > 1:
+            record['categories'] = paths[group]
+    return list(merged.values())
+
+
+def read_listings(directory):
+    """Get dictionary of normalized url: paths of later links to it"""
+    listings = collections.defaultdict(list)
+    for url, path in iter_listings(directory):
+        listings[normalize_url(url)].append(path)
+    return listings
+
+
+def main(input_dir, output_dir, segment_size):
+    """Write the recipes of input_dir with duplicates merged"""
+    if segment_paths(output_dir):
+        raise SystemExit(f'{output_dir} already has recipes')
+    start = time.perf_counter()
+    records = list(iter_recipes(input_dir))
+    unique = dedup(records, read_listings(input_dir))
+    with RecipeSink(output_dir, segment_size) as sink:
+        for record in unique:
+            sink.write(record)
+    print(f'Merged {len(records)} recipes into {len(unique)} '
+          f'in {time.perf_counter() - start:.2f}s')
+
+
+def parse_args():
+    """Get command line options"""
+    parser = argparse.ArgumentParser(description='Merge duplicate recipes')
+    parser.add_argument('input', help='directory of recipe jsonl segments')
+    parser.add_argument('output', help='directory for merged segments')
+    parser.add_argument('--segment-size', type=int, default=1000,
+                        help='number of recipes in each segment')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args.input, args.output, args.segment_size)
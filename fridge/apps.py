@@ -1,5 +1,23 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class FridgeConfig(AppConfig):
     name = 'fridge'
+
+    def ready(self):
+        from fridge import coverage, list_cache, metrics, sqlite_tuning
+        from fridge.autocomplete import PrefixIndex
+        from fridge.corpus import load_ingredients
+        coverage.connect_signals()
+        list_cache.connect_signals()
+        metrics.connect_signals()
+        sqlite_tuning.connect_signals()
+        # built once per process for the autocomplete view,
+        # empty in a checkout without scraped ingredients
+        ingredients = {}
+        if os.path.exists(settings.INGREDIENTS_PATH):
+            ingredients = load_ingredients(settings.INGREDIENTS_PATH)
+        self.autocomplete = PrefixIndex(ingredients)
@@ -0,0 +1,74 @@
+"""Ingredient name autocomplete from a prefix trie
+Every catalogue name is indexed from the start of each of its words,
+so cherry tom and tom both find Cherry Tomatoes.
+Matching ignores case and accents.
+
+Each trie node keeps its best completions, so a lookup only walks
+the characters of the query. Completions starting with the query
+come before ones with the query inside, then shorter names first.
+
+A query with a typo, like tomatos, falls back to the completions of
+its longest indexed prefix, tomato.
+"""
+
+from fridge.canonical import strip_accents
+
+
+# completions kept at each node, the most a lookup can return
+MAX_COMPLETIONS = 10
+# shortest prefix to fall back to for a query with no completions
+MIN_FALLBACK = 3
+
+
+def fold(text):
+    """Get text lower case, without accents and with single spaces"""
+    return strip_accents(' '.join(text.lower().split()))
+
+
+class Node:
+    __slots__ = ('children', 'completions')
+
+    def __init__(self):
+        self.children = {}
+        self.completions = []
+
+
+class PrefixIndex:
+    """Trie of catalogue names by the folded text from each word"""
+
+    def __init__(self, ingredients):
+        self.root = Node()
+        entries = sorted(
+            ((name, category) for category, names in ingredients.items()
+             for name in names),
+            key=lambda entry: (len(entry[0]), entry[0]))
+        # names starting with a query are inserted first, so rank first
+        for entry in entries:
+            self.insert(fold(entry[0]), entry)
+        for entry in entries:
+            words = fold(entry[0]).split(' ')
+            for i in range(1, len(words)):
+                self.insert(' '.join(words[i:]), entry)
+
+    def insert(self, key, entry):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, Node())
+            if len(node.completions) < MAX_COMPLETIONS \
+                    and entry not in node.completions:
+                node.completions.append(entry)
+
+    def complete(self, query, limit=MAX_COMPLETIONS):
+        """Get list of (name, category) completing query"""
+        query = fold(query)
+        node = self.root
+        depth = 0
+        for char in query:
+            child = node.children.get(char)
+            if child is None:
+                break
+            node = child
+            depth += 1
+        if depth < len(query) and depth < MIN_FALLBACK:
+            return []
+        return node.completions[:limit]
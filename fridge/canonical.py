@@ -0,0 +1,140 @@
+"""Match recipe ingredient lines to the ingredients catalogue
+Map free text lines from recipes to the canonical names
+in ingredients.json, e.g.
+    1 clove garlic -> Vegetables/Garlic
+    2 level tablespoons tomato purée -> Other Ingredients/Tomato Puree
+
+Words are normalized so plurals and accents match:
+    Tomatoes, tomato -> tomato
+    purée, puree -> pure
+A catalogue name matches a line if all its words are in the line.
+Names inside a longer match are dropped, so cherry tomatoes matches
+Cherry Tomatoes but not Tomato.
+
+Catalogue names are indexed by word, so a line is only compared with
+names sharing a word with it. Write the mapping for a corpus with:
+
+    python -m fridge.canonical recipes.json ingredients.json \
+        recipe_ingredients.json
+"""
+
+import collections
+import functools
+import json
+import re
+import sys
+import time
+import unicodedata
+
+from fridge.corpus import load_ingredients, load_recipes
+from fridge.ingredient_parser import parse_lines
+
+
+STOP_WORDS = {'a', 'an', 'and', 'or', 'of', 'the', 'for', 'with', 'to', 'in'}
+# plurals the suffix rules get wrong
+IRREGULAR = {'leaves': 'leaf', 'halves': 'half', 'loaves': 'loaf',
+             'knives': 'knife'}
+WORD_RE = re.compile(r'[a-z]+')
+
+
+@functools.lru_cache(maxsize=100000)
+def normalize_word(word):
+    """Get a stem of a word shared by its singular and plural"""
+    if word in IRREGULAR:
+        return IRREGULAR[word]
+    if len(word) > 4 and word.endswith('ies'):
+        word = word[:-3] + 'i'
+    elif word.endswith('oes'):
+        word = word[:-2]
+    elif word.endswith(('ses', 'xes', 'ches', 'shes')):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith('s') \
+            and not word.endswith(('ss', 'us')):
+        word = word[:-1]
+    # berry and berries, olive and olives share a stem
+    if len(word) > 3 and word.endswith('y'):
+        word = word[:-1] + 'i'
+    elif len(word) > 3 and word.endswith('e'):
+        word = word[:-1]
+    return word
+
+
+def strip_accents(text):
+    """Get text without accents, tomato purée -> tomato puree"""
+    # only text with accents needs the slow path
+    try:
+        text.encode('ascii')
+    except UnicodeEncodeError:
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text)
+                       if not unicodedata.combining(c))
+    return text
+
+
+@functools.lru_cache(maxsize=100000)
+def tokens(text):
+    """Get frozenset of normalized words in text without accents"""
+    text = strip_accents(text.lower())
+    return frozenset(normalize_word(word) for word in WORD_RE.findall(text)
+                     if word not in STOP_WORDS)
+
+
+def name_key(name):
+    """Get the key of a name matching no catalogue ingredient
+    Names with the same normalized words share it, None if there are none
+    """
+    words = tokens(name)
+    return ' '.join(sorted(words)) if words else None
+
+
+class CatalogueIndex:
+    """Catalogue names indexed by their normalized words"""
+
+    def __init__(self, ingredients):
+        # entry is (tokens, 'category/name')
+        self.by_word = collections.defaultdict(list)
+        for category, names in ingredients.items():
+            for name in names:
+                entry = (tokens(name), f'{category}/{name}')
+                for word in entry[0]:
+                    self.by_word[word].append(entry)
+
+    def match(self, text):
+        """Get sorted list of 'category/name' matching text"""
+        words = tokens(text)
+        found = {entry for word in words
+                 for entry in self.by_word.get(word, ())
+                 if entry[0] <= words}
+        # keep only matches not inside a longer match
+        return sorted(name for entry_words, name in found
+                      if not any(entry_words < other for other, _ in found))
+
+
+def canonicalize_corpus(recipes, index):
+    """Get dictionary of recipe name: {line: ['category/name', ...]}
+    Lines are matched on their parsed ingredient name
+    """
+    lines = [line for recipe in recipes for line in recipe['ingredients']]
+    matches = {line.text: index.match(line.name)
+               for line in parse_lines(list(set(lines)))}
+    return {recipe['name']: {line: matches[line]
+                             for line in recipe['ingredients']}
+            for recipe in recipes}
+
+
+def main(recipes_path, ingredients_path, output_path):
+    """Write the catalogue matches of every line of a recipe corpus"""
+    start = time.perf_counter()
+    recipes = load_recipes(recipes_path)
+    index = CatalogueIndex(load_ingredients(ingredients_path))
+    mapping = canonicalize_corpus(recipes, index)
+    with open(output_path, 'w') as f:
+        json.dump(mapping, f)
+    lines = sum(len(recipe['ingredients']) for recipe in recipes)
+    matched = sum(1 for recipe in mapping.values()
+                  for names in recipe.values() if names)
+    print(f'Matched {matched} of {lines} lines from {len(recipes)} recipes '
+          f'in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:4])
@@ -0,0 +1,58 @@
+"""Load scraped recipe and ingredient data
+Recipes can be:
+    a json dictionary of recipe name: ingredient lines (recipes.json)
+    a jsonl file of recipe records
+    a directory of jsonl segments written by recipies.py
+    a corpus store file, see fridge.corpus_store
+Every recipe is returned as a record:
+    {'name': ..., 'category': [...], 'ingredients': [...], 'url': ...}
+A recipe merged from several listings by dedup_recipes.py also has
+'categories', every category path it is listed under.
+"""
+
+import glob
+import json
+import os
+
+from fridge.corpus_store import CorpusStore
+
+
+def iter_recipes(path):
+    """Get recipe records from path one at a time"""
+    if path.endswith('.bin'):
+        yield from CorpusStore(path).iter_recipes()
+        return
+    if os.path.isdir(path):
+        paths = sorted(glob.glob(os.path.join(path, 'recipes-*.jsonl')))
+    elif path.endswith('.jsonl'):
+        paths = [path]
+    else:
+        # old format, a single dictionary of name: ingredients
+        with open(path, encoding='utf8') as f:
+            recipes = json.load(f)
+        for name, ingredients in recipes.items():
+            yield {'name': name, 'category': [],
+                   'ingredients': ingredients, 'url': None}
+        return
+    for segment in paths:
+        with open(segment, encoding='utf8') as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def category_paths(record):
+    """Get list of every category path of a recipe record"""
+    return record.get('categories') or [record.get('category') or []]
+
+
+def load_recipes(path):
+    """Get list of recipe records from path"""
+    return list(iter_recipes(path))
+
+
+def load_ingredients(path):
+    """Get dictionary of ingredient category: ingredient names"""
+    if path.endswith('.bin'):
+        return CorpusStore(path).ingredients()
+    with open(path, encoding='utf8') as f:
+        return json.load(f)
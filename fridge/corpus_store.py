@@ -0,0 +1,200 @@
+"""Compact memory mapped store for the recipe and ingredient corpus
+The json files are converted once to a binary file:
+
+    python -m fridge.corpus_store recipes.json ingredients.json corpus.bin
+
+A reader maps the file into memory instead of loading it, so opening is
+instant, only the pages a lookup touches are read, and processes reading
+the same file share its pages.
+
+Layout, all integers are little endian unsigned 32 bit:
+    header: magic, version, then offset and length of each section
+    strings: offsets array then utf8 text, every string is stored once
+    categories: category name ids, offsets into the category ingredients,
+        category ingredient name ids
+    recipes: name ids, url ids, offsets into the lines,
+        line ids, offsets into the paths, category path ids,
+        recipe ids sorted by name for binary search
+The category paths of a recipe listed under several are separated by NONE,
+version 1 stores without them read the same.
+"""
+
+import array
+import mmap
+import sys
+
+
+MAGIC = int.from_bytes(b'FRDG', 'little')
+VERSION = 2
+NONE = 0xFFFFFFFF
+SECTIONS = [
+    'string_offsets', 'string_data',
+    'category_names', 'category_offsets', 'category_items',
+    'recipe_names', 'recipe_urls', 'line_offsets', 'lines',
+    'path_offsets', 'paths', 'recipes_by_name',
+]
+# magic, version, then offset and length of every section
+HEADER_SIZE = 4 * (2 + 2 * len(SECTIONS))
+
+
+class StringTable:
+    """Strings numbered in order of first use"""
+
+    def __init__(self):
+        self.ids = {}
+
+    def add(self, text):
+        if text is None:
+            return NONE
+        return self.ids.setdefault(text, len(self.ids))
+
+    def sections(self):
+        offsets = array.array('I', [0])
+        data = bytearray()
+        for text in self.ids:
+            data += text.encode('utf8')
+            offsets.append(len(data))
+        return offsets, bytes(data)
+
+
+def convert(recipes, ingredients, path):
+    """Write recipe records and ingredient categories to a store file"""
+    # imported here as fridge.corpus reads store files with this module
+    from fridge.corpus import category_paths
+    strings = StringTable()
+    sections = {name: array.array('I') for name in SECTIONS}
+    sections['category_offsets'].append(0)
+    for category, names in ingredients.items():
+        sections['category_names'].append(strings.add(category))
+        sections['category_items'].extend(strings.add(n) for n in names)
+        sections['category_offsets'].append(len(sections['category_items']))
+    sections['line_offsets'].append(0)
+    sections['path_offsets'].append(0)
+    recipe_names = []
+    for recipe in recipes:
+        recipe_names.append(recipe['name'])
+        sections['recipe_names'].append(strings.add(recipe['name']))
+        sections['recipe_urls'].append(strings.add(recipe.get('url')))
+        sections['lines'].extend(strings.add(line)
+                                 for line in recipe['ingredients'])
+        sections['line_offsets'].append(len(sections['lines']))
+        for i, categories in enumerate(category_paths(recipe)):
+            if i:
+                sections['paths'].append(NONE)
+            sections['paths'].extend(strings.add(c) for c in categories)
+        sections['path_offsets'].append(len(sections['paths']))
+    sections['recipes_by_name'].extend(
+        sorted(range(len(recipe_names)), key=recipe_names.__getitem__))
+    sections['string_offsets'], sections['string_data'] = strings.sections()
+
+    header = array.array('I', [MAGIC, VERSION])
+    body = bytearray()
+    for name in SECTIONS:
+        data = sections[name]
+        if isinstance(data, array.array):
+            if sys.byteorder != 'little':
+                data.byteswap()
+            data = data.tobytes()
+        header.extend([HEADER_SIZE + len(body), len(data)])
+        body += data
+        # keep every section aligned for 32 bit reads
+        body += b'\0' * (-len(body) % 4)
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(body)
+
+
+class CorpusStore:
+    """Read only view of a store file"""
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise ValueError('Corpus store needs a little endian machine')
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        header = view[:HEADER_SIZE].cast('I')
+        if header[0] != MAGIC or header[1] not in (1, VERSION):
+            raise ValueError(f'{path} is not a version {VERSION} store')
+        for i, name in enumerate(SECTIONS):
+            offset, length = header[2 + 2 * i], header[3 + 2 * i]
+            section = view[offset:offset + length]
+            setattr(self, f'_{name}',
+                    section if name == 'string_data' else section.cast('I'))
+
+    def string(self, string_id):
+        """Get a string from the string table"""
+        if string_id == NONE:
+            return None
+        start = self._string_offsets[string_id]
+        end = self._string_offsets[string_id + 1]
+        return str(self._string_data[start:end], 'utf8')
+
+    def _strings(self, ids, start, end):
+        return [self.string(ids[i]) for i in range(start, end)]
+
+    def ingredients(self):
+        """Get dictionary of category: ingredient names"""
+        offsets = self._category_offsets
+        return {self.string(category_id):
+                self._strings(self._category_items, offsets[i], offsets[i + 1])
+                for i, category_id in enumerate(self._category_names)}
+
+    def __len__(self):
+        return len(self._recipe_names)
+
+    def recipe(self, recipe_id):
+        """Get a recipe record by position"""
+        lines, offsets = self._line_offsets, self._path_offsets
+        paths = [[]]
+        for string_id in self._paths[offsets[recipe_id]:
+                                     offsets[recipe_id + 1]]:
+            if string_id == NONE:
+                paths.append([])
+            else:
+                paths[-1].append(self.string(string_id))
+        record = {
+            'name': self.string(self._recipe_names[recipe_id]),
+            'category': paths[0],
+            'ingredients': self._strings(self._lines, lines[recipe_id],
+                                         lines[recipe_id + 1]),
+            'url': self.string(self._recipe_urls[recipe_id]),
+        }
+        if len(paths) > 1:
+            record['categories'] = paths
+        return record
+
+    def iter_recipes(self):
+        """Get recipe records one at a time"""
+        for recipe_id in range(len(self)):
+            yield self.recipe(recipe_id)
+
+    def find_recipe(self, name):
+        """Get a recipe record by name or None, by binary search"""
+        by_name = self._recipes_by_name
+        low, high = 0, len(by_name)
+        while low < high:
+            middle = (low + high) // 2
+            if self.string(self._recipe_names[by_name[middle]]) < name:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(by_name):
+            recipe = self.recipe(by_name[low])
+            if recipe['name'] == name:
+                return recipe
+        return None
+
+
+def main(recipes_path, ingredients_path, output_path):
+    """Convert json recipes and ingredients to a store file"""
+    # imported here as fridge.corpus reads store files with this module
+    from fridge.corpus import iter_recipes, load_ingredients
+    convert(list(iter_recipes(recipes_path)),
+            load_ingredients(ingredients_path), output_path)
+    store = CorpusStore(output_path)
+    print(f'Wrote {len(store)} recipes to {output_path}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:4])
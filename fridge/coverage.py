@@ -0,0 +1,194 @@
+"""Recipe coverage of each list, kept up to date as items change
+Each item is linked to the catalogue ingredients its text matches,
+and a list has an ingredient while any of its items is linked to it.
+ListRecipeCoverage holds, for each recipe sharing an ingredient with
+a list, how many of the recipe's ingredients the list has and misses.
+
+When an item brings a new ingredient to a list only the rows of
+recipes using that ingredient change, the same when the last item
+with an ingredient goes, so the cost of a write does not depend on
+the size of the corpus. Reading the recipes missing n ingredients is
+a lookup on the (list, missing, covered) index.
+
+Recipes are covered over their catalogue ingredients,
+lines matching no catalogue name, like salt to taste, do not count.
+
+Items are matched with a catalogue built once per process and kept
+until the catalogue version in the shared cache changes, which
+import_catalogue and writes to Ingredient do.
+"""
+
+import functools
+import uuid
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from fridge.canonical import CatalogueIndex
+from fridge.ingredient_parser import parse_line
+from fridge.models import Ingredient, Item, ListRecipeCoverage
+
+
+ItemIngredient = Item.ingredients.through
+
+# SQLite before 3.32 allows 999 variables in a statement
+MAX_VARIABLES = 900
+CATALOGUE_KEY = 'fridge:catalogue:version'
+
+# recipes using any of the ingredients, {ids} is their placeholders
+UPDATE_COVERAGE = '''
+UPDATE fridge_listrecipecoverage SET
+    covered = covered + %s * (
+        SELECT COUNT(DISTINCT ingredient_id) FROM fridge_recipeingredient
+        WHERE recipe_id = fridge_listrecipecoverage.recipe_id
+        AND ingredient_id IN ({ids})),
+    missing = missing - %s * (
+        SELECT COUNT(DISTINCT ingredient_id) FROM fridge_recipeingredient
+        WHERE recipe_id = fridge_listrecipecoverage.recipe_id
+        AND ingredient_id IN ({ids}))
+WHERE list_id = %s AND recipe_id IN (
+    SELECT recipe_id FROM fridge_recipeingredient
+    WHERE ingredient_id IN ({ids}))
+'''
+INSERT_COVERAGE = '''
+INSERT INTO fridge_listrecipecoverage (list_id, recipe_id, covered, missing)
+SELECT %s, counts.recipe_id, counts.n,
+    CASE WHEN fridge_recipe.ingredient_count > counts.n
+    THEN fridge_recipe.ingredient_count - counts.n ELSE 0 END
+FROM (
+    SELECT recipe_id, COUNT(DISTINCT ingredient_id) AS n
+    FROM fridge_recipeingredient WHERE ingredient_id IN ({ids})
+    GROUP BY recipe_id) AS counts
+JOIN fridge_recipe ON fridge_recipe.id = counts.recipe_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM fridge_listrecipecoverage
+    WHERE list_id = %s AND recipe_id = counts.recipe_id)
+'''
+DELETE_UNCOVERED = '''
+DELETE FROM fridge_listrecipecoverage
+WHERE list_id = %s AND covered = 0 AND recipe_id IN (
+    SELECT recipe_id FROM fridge_recipeingredient
+    WHERE ingredient_id IN ({ids}))
+'''
+
+
+def catalogue_version():
+    """Get the current version token of the catalogue"""
+    version = cache.get(CATALOGUE_KEY)
+    if version is None:
+        # unknown or expired, every process rebuilds once
+        cache.add(CATALOGUE_KEY, uuid.uuid4().hex)
+        version = cache.get(CATALOGUE_KEY)
+    return version
+
+
+def catalogue_changed():
+    """Make every process rebuild its catalogue on its next use"""
+    cache.set(CATALOGUE_KEY, uuid.uuid4().hex)
+
+
+def get_catalogue():
+    """Get (CatalogueIndex, name: id) of the Ingredient table
+    Reading the version from the cache costs no query,
+    and an import by another process is seen by the next request
+    """
+    return build_catalogue(catalogue_version())
+
+
+@functools.lru_cache(maxsize=1)
+def build_catalogue(version):
+    """Get (CatalogueIndex, name: id) of the Ingredient table"""
+    ingredients, ids = {}, {}
+    for ingredient_id, name, category in Ingredient.objects.values_list(
+            'id', 'name', 'category'):
+        ingredients.setdefault(category, []).append(name)
+        ids[name] = ingredient_id
+    return CatalogueIndex(ingredients), ids
+
+
+def item_ingredient_ids(text):
+    """Get set of ids of the catalogue ingredients an item text matches"""
+    index, ids = get_catalogue()
+    return {ids[match.split('/', 1)[1]]
+            for match in index.match(parse_line(text).name)}
+
+
+def other_items_have(list_, ingredient_ids, items):
+    """Get which ingredients items of a list other than items have"""
+    return set(ItemIngredient.objects.filter(
+        item__list=list_, ingredient_id__in=ingredient_ids
+    ).exclude(item__in=items).values_list('ingredient_id', flat=True))
+
+
+def change_coverage(list_, ingredient_ids, sign):
+    """Add (sign 1) or take away (sign -1) ingredients of a list
+    in the rows of the recipes using them
+    """
+    if not ingredient_ids:
+        return
+    ids = sorted(ingredient_ids)
+    # each id is bound 3 times besides the list and sign,
+    # counts over disjoint chunks add up
+    chunk_size = (MAX_VARIABLES - 3) // 3
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(UPDATE_COVERAGE.format(ids=placeholders),
+                           [sign, *chunk, sign, *chunk, list_.id, *chunk])
+            if sign > 0:
+                cursor.execute(INSERT_COVERAGE.format(ids=placeholders),
+                               [list_.id, *chunk, list_.id])
+            else:
+                cursor.execute(DELETE_UNCOVERED.format(ids=placeholders),
+                               [list_.id, *chunk])
+
+
+def add_items(list_, items):
+    """Link saved items to their ingredients and cover the new ones"""
+    links = [ItemIngredient(item_id=item.id, ingredient_id=ingredient_id)
+             for item in items
+             for ingredient_id in item_ingredient_ids(item.text)]
+    if not links:
+        return
+    ItemIngredient.objects.bulk_create(links)
+    added = {link.ingredient_id for link in links}
+    change_coverage(list_, added - other_items_have(list_, added, items), 1)
+
+
+def ingredients_of(items):
+    """Get set of ids of the ingredients items are linked to"""
+    return set(ItemIngredient.objects.filter(item__in=items)
+               .values_list('ingredient_id', flat=True))
+
+
+def remove_ingredients(list_, ingredient_ids):
+    """Uncover ingredients of deleted items that no item of the list has
+    ingredient_ids come from ingredients_of the items before deleting them
+    """
+    change_coverage(
+        list_, ingredient_ids - other_items_have(list_, ingredient_ids, []),
+        -1)
+
+
+def rebuild(list_):
+    """Link all items of a list and cover their ingredients again"""
+    ListRecipeCoverage.objects.filter(list=list_).delete()
+    ItemIngredient.objects.filter(item__list=list_).delete()
+    add_items(list_, list(list_.item_set.all()))
+
+
+def change_on_write(sender, instance, **kwargs):
+    """Change the catalogue version once an Ingredient write commits"""
+    transaction.on_commit(catalogue_changed)
+
+
+def connect_signals():
+    """Change the catalogue version on Ingredient writes
+    bulk_create sends no signals, import_catalogue changes it itself
+    """
+    post_save.connect(change_on_write, sender=Ingredient,
+                      dispatch_uid='coverage_ingredient_save')
+    post_delete.connect(change_on_write, sender=Ingredient,
+                        dispatch_uid='coverage_ingredient_delete')
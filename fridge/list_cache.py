@@ -0,0 +1,80 @@
+"""Cache of fridge list data and rendered item tables
+Every cached value of a list is keyed by the list's version,
+a random token replaced whenever a write to the list or its items commits.
+A write makes all cached values of the list stale at once
+and the stale entries age out of the bounded cache.
+Versions expire with the cache timeout like the values keyed by them,
+an expired version is replaced by a new one no client can hold.
+
+The version is also the base of the list page ETag, so a client
+holding the current page gets a 304 without touching the database.
+"""
+
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.db.models.signals import post_delete, post_save
+
+from fridge.models import Item, List
+
+
+def version_key(list_id):
+    return f'fridge:list:{list_id}:version'
+
+
+def get_version(list_id):
+    """Get the current version token of a list"""
+    version = cache.get(version_key(list_id))
+    if version is None:
+        # unknown or evicted, start a version no client can hold
+        cache.add(version_key(list_id), uuid.uuid4().hex)
+        version = cache.get(version_key(list_id))
+    return version
+
+
+def bump(list_id):
+    """Make every cached value of a list stale"""
+    cache.set(version_key(list_id), uuid.uuid4().hex)
+
+
+def get_or_set(list_id, name, default):
+    """Get a cached value of the current list version
+    default is called to make the value if it is not cached
+    """
+    key = f'fridge:list:{list_id}:{get_version(list_id)}:{name}'
+    return cache.get_or_set(key, default)
+
+
+def list_etag(request, list_id):
+    """Get the ETag of a list page
+    The page holds the csrf token, so the etag varies with the csrf cookie
+    """
+    # makes the csrf cookie on the first visit, as rendering the page would
+    get_token(request)
+    csrf = request.META['CSRF_COOKIE']
+    return hashlib.md5(
+        f'{get_version(list_id)}:{request.GET.urlencode()}:{csrf}'.encode()
+    ).hexdigest()
+
+
+def bump_on_write(sender, instance, **kwargs):
+    """Bump the list of a saved or deleted list or item
+    once the write commits, so a page rendered in the meantime
+    from the old rows is cached under the old version
+    """
+    list_id = getattr(instance, 'list_id', instance.pk)
+    transaction.on_commit(lambda: bump(list_id))
+
+
+def connect_signals():
+    """Bump list versions on model writes
+    bulk_create sends no signals, its callers bump the list themselves
+    """
+    for model in (Item, List):
+        post_save.connect(bump_on_write, sender=model,
+                          dispatch_uid=f'list_cache_{model.__name__}_save')
+        post_delete.connect(bump_on_write, sender=model,
+                            dispatch_uid=f'list_cache_{model.__name__}_delete')
@@ -0,0 +1,244 @@
+"""Import scraped ingredients and recipes into the database
+Run with:
+    python manage.py import_catalogue --ingredients ingredients.json \
+        --recipes recipes/
+
+Recipes are read one at a time from json, jsonl or a corpus store
+and written in batches, each batch in one transaction with bulk inserts.
+Rows are matched by name, so importing again only writes new or
+changed recipes.
+A line matching several catalogue ingredients, like salt and freshly
+milled black pepper, gets a row for each.
+List coverage of changed recipes is not updated, run rebuild_coverage
+after importing into a database with lists.
+
+The full text index triggers on lines rewrite a recipe's index row for
+every line, so a batch drops them, indexes each recipe it wrote once
+and makes them again, all in its transaction.
+"""
+
+import itertools
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from fridge import coverage
+from fridge.canonical import CatalogueIndex
+from fridge.corpus import category_paths, iter_recipes, load_ingredients
+from fridge.ingredient_parser import parse_lines
+from fridge.models import Ingredient, Recipe, RecipeIngredient
+
+
+MAX_VARIABLES = coverage.MAX_VARIABLES
+LINE_TRIGGERS = ['fridge_recipeingredient_fts_insert',
+                 'fridge_recipeingredient_fts_delete']
+INSERT_LINE = '''
+INSERT INTO fridge_recipeingredient (recipe_id, text, ingredient_id, name,
+    quantity, unit, metric_quantity, metric_unit)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+'''
+INDEX_LINES = '''
+UPDATE fridge_recipe_fts SET ingredients = (
+    SELECT coalesce(group_concat(text, ' '), '') FROM fridge_recipeingredient
+    WHERE recipe_id = fridge_recipe_fts.rowid)
+WHERE rowid IN ({ids})
+'''
+
+
+def batches(iterable, size):
+    """Get lists of up to size items from iterable"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def category_text(record):
+    """Get the Recipe.category of a record"""
+    return '; '.join('/'.join(path) for path in category_paths(record))
+
+
+class Command(BaseCommand):
+    help = 'Import scraped ingredients and recipes, matching rows by name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients',
+                            help='ingredients json or corpus store')
+        parser.add_argument('--recipes',
+                            help='recipes json, jsonl, segment directory '
+                                 'or corpus store')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='recipes written in each transaction')
+
+    def handle(self, *args, **options):
+        if options['ingredients']:
+            self.import_ingredients(load_ingredients(options['ingredients']))
+        if options['recipes']:
+            self.import_recipes(iter_recipes(options['recipes']),
+                                options['batch_size'])
+
+    def import_ingredients(self, ingredients):
+        """Add new ingredients and update changed categories"""
+        # first category of a name wins
+        categories = {}
+        for category, names in ingredients.items():
+            for name in names:
+                categories.setdefault(name, category)
+        with transaction.atomic():
+            existing = dict(Ingredient.objects.values_list('name', 'category'))
+            Ingredient.objects.bulk_create(
+                Ingredient(name=name, category=category)
+                for name, category in categories.items()
+                if name not in existing)
+            for name, category in categories.items():
+                if name in existing and existing[name] != category:
+                    Ingredient.objects.filter(name=name).update(
+                        category=category)
+        coverage.catalogue_changed()
+        self.stdout.write(f'{len(categories)} ingredients, '
+                          f'{len(categories.keys() - existing.keys())} new')
+
+    def import_recipes(self, recipes, batch_size):
+        """Upsert recipes by name in batches"""
+        # lines are linked to the catalogue ingredient they match
+        catalogue = {}
+        for name, category in Ingredient.objects.values_list('name',
+                                                             'category'):
+            catalogue.setdefault(category, []).append(name)
+        self.catalogue = CatalogueIndex(catalogue)
+        self.ingredient_ids = dict(
+            Ingredient.objects.values_list('name', 'id'))
+        self.line_triggers = self.get_line_triggers()
+        start = time.perf_counter()
+        total = written = 0
+        for batch in batches(recipes, batch_size):
+            written += self.import_batch(batch)
+            total += len(batch)
+            seconds = time.perf_counter() - start
+            self.stdout.write(f'{total} recipes read, {written} written, '
+                              f'{total / seconds:.0f} rows/s')
+
+    def get_line_triggers(self):
+        """Get create statements of the full text index line triggers"""
+        if connection.vendor != 'sqlite':
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' "
+                'AND name IN (%s, %s)', LINE_TRIGGERS)
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_lines(self, recipe_ids):
+        """Write the index rows of recipes from their lines"""
+        with connection.cursor() as cursor:
+            for chunk in batches(recipe_ids, MAX_VARIABLES):
+                cursor.execute(
+                    INDEX_LINES.format(ids=', '.join(['%s'] * len(chunk))),
+                    chunk)
+
+    def ingredient_ids_of(self, parsed_line):
+        """Get ids of the catalogue ingredients a parsed line matches
+        [None] if it matches none, so the line still gets a row
+        """
+        return [self.ingredient_ids[match.split('/', 1)[1]]
+                for match in self.catalogue.match(parsed_line.name)] or [None]
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        """Write new and changed recipes of a batch
+        Return number of recipes written
+        """
+        if self.line_triggers:
+            # first, so the transaction starts with a write
+            with connection.cursor() as cursor:
+                for name in LINE_TRIGGERS:
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        # last record of a name in a batch wins
+        records = {record['name']: record for record in batch}
+        existing = {}
+        for names in batches(records, MAX_VARIABLES):
+            existing.update(
+                (recipe['name'], recipe) for recipe in Recipe.objects.filter(
+                    name__in=names).values('id', 'name', 'url', 'category'))
+        existing_lines = {}
+        for recipe_ids in batches([r['id'] for r in existing.values()],
+                                  MAX_VARIABLES):
+            for recipe_id, text in RecipeIngredient.objects.filter(
+                    recipe_id__in=recipe_ids
+            ).order_by('id').values_list('recipe_id', 'text'):
+                # consecutive rows of a line matching several ingredients
+                lines = existing_lines.setdefault(recipe_id, [])
+                if not lines or lines[-1] != text:
+                    lines.append(text)
+
+        changed = set()
+        for name, record in records.items():
+            recipe = existing.get(name)
+            if recipe is None:
+                continue
+            url, category = record.get('url') or '', category_text(record)
+            if (recipe['url'], recipe['category']) != (url, category):
+                Recipe.objects.filter(id=recipe['id']).update(
+                    url=url, category=category)
+            if existing_lines.get(recipe['id'], []) != [
+                    line for line, _ in itertools.groupby(
+                        record['ingredients'])]:
+                changed.add(recipe['id'])
+
+        to_write = [name for name in records
+                    if name not in existing or existing[name]['id'] in changed]
+        lines = [line for name in to_write
+                 for line in records[name]['ingredients']]
+        parsed = dict(zip(lines, parse_lines(lines)))
+        line_ingredients = {line: self.ingredient_ids_of(parsed[line])
+                            for line in parsed}
+        # distinct catalogue ingredients of each recipe
+        counts = {name: len({ingredient_id
+                             for line in records[name]['ingredients']
+                             for ingredient_id in line_ingredients[line]}
+                            - {None})
+                  for name in to_write}
+
+        Recipe.objects.bulk_create(
+            Recipe(name=name, url=records[name].get('url') or '',
+                   category=category_text(records[name]),
+                   ingredient_count=counts[name])
+            for name in to_write if name not in existing)
+        # bulk_create does not return ids on SQLite
+        ids = {name: recipe['id'] for name, recipe in existing.items()}
+        for names in batches([name for name in to_write if name not in ids],
+                             MAX_VARIABLES):
+            ids.update(Recipe.objects.filter(name__in=names)
+                       .values_list('name', 'id'))
+        for recipe_ids in batches(changed, MAX_VARIABLES):
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).delete()
+        by_count = {}
+        for name in to_write:
+            if name in existing:
+                by_count.setdefault(counts[name], []).append(ids[name])
+        for count, recipe_ids in by_count.items():
+            for chunk in batches(recipe_ids, MAX_VARIABLES):
+                Recipe.objects.filter(id__in=chunk).update(
+                    ingredient_count=count)
+
+        rows = []
+        for name in to_write:
+            for line in records[name]['ingredients']:
+                record = parsed[line]
+                metric_quantity, metric_unit = record.metric or (None, '')
+                rows.extend((ids[name], line, ingredient_id,
+                             record.name[:200], record.quantity,
+                             record.unit or '', metric_quantity, metric_unit)
+                            for ingredient_id in line_ingredients[line])
+        # one statement run for every row, no model instances
+        with connection.cursor() as cursor:
+            cursor.executemany(INSERT_LINE, rows)
+        if self.line_triggers:
+            self.index_lines([ids[name] for name in to_write])
+            with connection.cursor() as cursor:
+                for statement in self.line_triggers:
+                    cursor.execute(statement)
+        return len(to_write)
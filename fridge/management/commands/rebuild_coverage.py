@@ -0,0 +1,25 @@
+"""Rebuild the recipe coverage of every list
+Run with:
+    python manage.py rebuild_coverage
+
+Items are matched to the catalogue again, so run after importing
+ingredients or recipes into a database with lists.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from fridge import coverage
+from fridge.models import List
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the recipe coverage of every list'
+
+    def handle(self, *args, **options):
+        lists = 0
+        for list_ in List.objects.iterator():
+            with transaction.atomic():
+                coverage.rebuild(list_)
+            lists += 1
+        self.stdout.write(f'Rebuilt coverage of {lists} lists')
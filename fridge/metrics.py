@@ -0,0 +1,264 @@
+"""Request timing and SQL metrics
+MetricsMiddleware records for every request, labelled by view:
+    fridge_view_seconds wall time of the request
+    fridge_template_seconds time rendering templates
+    fridge_sql_queries number of SQL queries
+    fridge_sql_seconds time in SQL queries
+into in-process histograms, served in Prometheus text format by
+metrics_view. Each server process has its own histograms.
+
+Requests slower than settings.METRICS_SLOW_REQUEST_SECONDS are logged
+to the fridge.metrics logger with their slowest queries.
+A streaming response is recorded when its content is closed,
+so queries run while it streams are counted.
+
+Template time is measured by TimedDjangoTemplates, set as the
+template BACKEND in settings.
+Django 1.11 has no hook around query execution, so every new
+connection makes its cursors through TimedCursor. It only keeps a count,
+a sum and the slowest few statements, not the SQL of every query.
+
+metrics_view answers staff users, and a scraper sending
+"Authorization: Bearer <settings.METRICS_TOKEN>".
+"""
+
+import bisect
+import heapq
+import hmac
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+METRICS = {
+    'fridge_view_seconds': ('Request wall time', SECONDS_BUCKETS),
+    'fridge_template_seconds': ('Template render time', SECONDS_BUCKETS),
+    'fridge_sql_queries': ('SQL queries per request', COUNT_BUCKETS),
+    'fridge_sql_seconds': ('SQL time per request', SECONDS_BUCKETS),
+}
+# slowest queries logged for a slow request
+SLOW_QUERIES_LOGGED = 5
+
+
+class Histogram:
+    """Counts of observed values at or below each bucket bound"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # last count is for values above every bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        """Get Prometheus text lines, buckets are cumulative"""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {total}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {total}'
+
+
+class Registry:
+    """Histograms by metric name and view"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in METRICS}
+
+    def observe(self, view, values):
+        """Record dictionary of metric name: value for a view"""
+        with self.lock:
+            for name, value in values.items():
+                histograms = self.histograms[name]
+                if view not in histograms:
+                    histograms[view] = Histogram(METRICS[name][1])
+                histograms[view].observe(value)
+
+    def text(self):
+        """Get all histograms in Prometheus text format"""
+        lines = []
+        with self.lock:
+            for name, (help_text, _) in METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for view, histogram in sorted(self.histograms[name].items()):
+                    lines.extend(histogram.lines(name, f'view="{view}"'))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+# template render seconds and QueryStats of the request running
+# in this thread
+_local = threading.local()
+
+
+class QueryStats:
+    """Count and time of the queries of one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # heap of the slowest (seconds, sql)
+        self.slowest = []
+
+    def add(self, sql, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if len(self.slowest) < SLOW_QUERIES_LOGGED:
+            heapq.heappush(self.slowest, (seconds, sql))
+        else:
+            heapq.heappushpop(self.slowest, (seconds, sql))
+
+
+class TimedCursor:
+    """Cursor wrapper adding its queries to the current request"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.cursor.__exit__(type, value, traceback)
+
+    def execute(self, sql, params=None):
+        return self.timed(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self.timed(self.cursor.executemany, sql, param_list)
+
+    def timed(self, method, sql, params):
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            queries = getattr(_local, 'queries', None)
+            # outside a request, e.g. in a management command
+            if queries is not None:
+                queries.add(sql, time.perf_counter() - start)
+
+
+def time_queries(sender, connection, **kwargs):
+    """Make the cursors of a new connection through TimedCursor"""
+    wrapper = type(connection)
+    connection.make_cursor = lambda cursor: TimedCursor(
+        wrapper.make_cursor(connection, cursor))
+    connection.make_debug_cursor = lambda cursor: TimedCursor(
+        wrapper.make_debug_cursor(connection, cursor))
+
+
+def connect_signals():
+    connection_created.connect(time_queries, dispatch_uid='metrics_queries')
+
+
+class TimedTemplate:
+    """Template wrapper adding its render time to the current request"""
+
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            _local.template_seconds = getattr(
+                _local, 'template_seconds', 0.0) + time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend timing every render"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class MetricsMiddleware:
+    """Time requests, templates and SQL queries of every view"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS',
+                                    0.5)
+
+    def __call__(self, request):
+        _local.template_seconds = 0.0
+        _local.queries = QueryStats()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            _local.queries = None
+            raise
+        if not response.streaming:
+            self.record(request, start)
+            return response
+        response.streaming_content = self.recorded(
+            response.streaming_content, request, start)
+        return response
+
+    def recorded(self, content, request, start):
+        """Stream content, recording the request when it is closed"""
+        try:
+            yield from content
+        finally:
+            self.record(request, start)
+
+    def record(self, request, start):
+        seconds = time.perf_counter() - start
+        queries = _local.queries
+        _local.queries = None
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.observe(view, {
+            'fridge_view_seconds': seconds,
+            'fridge_template_seconds': _local.template_seconds,
+            'fridge_sql_queries': queries.count,
+            'fridge_sql_seconds': queries.seconds,
+        })
+        if seconds > self.slow_seconds:
+            slowest = sorted(queries.slowest, reverse=True)
+            logger.warning(
+                'Slow request %s %s %.3fs, %d queries in %.3fs%s',
+                request.method, request.path, seconds, queries.count,
+                queries.seconds,
+                ''.join(f'\n    {query_seconds:.3f}s {sql}'
+                        for query_seconds, sql in slowest))
+
+
+def metrics_view(request):
+    """Serve the histograms of this process in Prometheus text format"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    allowed = request.user.is_staff or (
+        token and hmac.compare_digest(authorization, f'Bearer {token}'))
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.text(),
+                        content_type='text/plain; version=0.0.4')
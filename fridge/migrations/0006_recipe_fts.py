@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# full text index of recipe names and ingredient lines, rowid is recipe id
+# triggers keep it in step with fridge_recipe and fridge_recipeingredient
+CREATE_FTS = [
+    """CREATE VIRTUAL TABLE fridge_recipe_fts USING fts5(
+        name, ingredients,
+        tokenize = 'porter unicode61 remove_diacritics 1')""",
+    """CREATE TRIGGER fridge_recipe_fts_insert AFTER INSERT ON fridge_recipe
+    BEGIN
+        INSERT INTO fridge_recipe_fts (rowid, name, ingredients)
+        VALUES (new.id, new.name, '');
+    END""",
+    """CREATE TRIGGER fridge_recipe_fts_update AFTER UPDATE OF name
+    ON fridge_recipe
+    BEGIN
+        UPDATE fridge_recipe_fts SET name = new.name WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER fridge_recipe_fts_delete AFTER DELETE ON fridge_recipe
+    BEGIN
+        DELETE FROM fridge_recipe_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER fridge_recipeingredient_fts_insert AFTER INSERT
+    ON fridge_recipeingredient
+    BEGIN
+        UPDATE fridge_recipe_fts SET ingredients = ingredients || ' ' || new.text
+        WHERE rowid = new.recipe_id;
+    END""",
+    """CREATE TRIGGER fridge_recipeingredient_fts_delete AFTER DELETE
+    ON fridge_recipeingredient
+    BEGIN
+        UPDATE fridge_recipe_fts SET ingredients = (
+            SELECT coalesce(group_concat(text, ' '), '')
+            FROM fridge_recipeingredient WHERE recipe_id = old.recipe_id)
+        WHERE rowid = old.recipe_id;
+    END""",
+]
+DROP_FTS = [
+    'DROP TRIGGER fridge_recipeingredient_fts_delete',
+    'DROP TRIGGER fridge_recipeingredient_fts_insert',
+    'DROP TRIGGER fridge_recipe_fts_delete',
+    'DROP TRIGGER fridge_recipe_fts_update',
+    'DROP TRIGGER fridge_recipe_fts_insert',
+    'DROP TABLE fridge_recipe_fts',
+]
+
+
+def run_on_sqlite(statements):
+    """Get migration function running statements on SQLite only"""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fridge', '0005_catalogue'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_FTS),
+                             run_on_sqlite(DROP_FTS)),
+    ]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 18:28
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# SQLite adds a column by copying the table, which drops its triggers,
+# so the full text index triggers of fridge_recipe from 0006 are made again
+RECIPE_TRIGGERS = [
+    """CREATE TRIGGER fridge_recipe_fts_insert AFTER INSERT ON fridge_recipe
+    BEGIN
+        INSERT INTO fridge_recipe_fts (rowid, name, ingredients)
+        VALUES (new.id, new.name, '');
+    END""",
+    """CREATE TRIGGER fridge_recipe_fts_update AFTER UPDATE OF name
+    ON fridge_recipe
+    BEGIN
+        UPDATE fridge_recipe_fts SET name = new.name WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER fridge_recipe_fts_delete AFTER DELETE ON fridge_recipe
+    BEGIN
+        DELETE FROM fridge_recipe_fts WHERE rowid = old.id;
+    END""",
+]
+COUNT_INGREDIENTS = """UPDATE fridge_recipe SET ingredient_count = (
+    SELECT COUNT(DISTINCT ingredient_id) FROM fridge_recipeingredient
+    WHERE recipe_id = fridge_recipe.id)"""
+
+
+def make_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in RECIPE_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fridge', '0006_recipe_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListRecipeCoverage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('covered', models.PositiveIntegerField()),
+                ('missing', models.PositiveIntegerField()),
+                ('list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fridge.List')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='ingredients',
+            field=models.ManyToManyField(blank=True, to='fridge.Ingredient'),
+        ),
+        # unapplying the field drops the triggers too
+        migrations.RunPython(migrations.RunPython.noop, make_triggers),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(make_triggers, migrations.RunPython.noop),
+        migrations.RunSQL([COUNT_INGREDIENTS], migrations.RunSQL.noop),
+        migrations.AddField(
+            model_name='listrecipecoverage',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fridge.Recipe'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='listrecipecoverage',
+            unique_together=set([('list', 'recipe')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='listrecipecoverage',
+            index_together=set([('list', 'missing', 'covered')]),
+        ),
+    ]
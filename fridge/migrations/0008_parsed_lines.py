@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 18:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# SQLite adds a column by copying the table, which drops its triggers,
+# so the full text index triggers of fridge_recipeingredient from 0006
+# are made again
+LINE_TRIGGERS = [
+    """CREATE TRIGGER fridge_recipeingredient_fts_insert AFTER INSERT
+    ON fridge_recipeingredient
+    BEGIN
+        UPDATE fridge_recipe_fts SET ingredients = ingredients || ' ' || new.text
+        WHERE rowid = new.recipe_id;
+    END""",
+    """CREATE TRIGGER fridge_recipeingredient_fts_delete AFTER DELETE
+    ON fridge_recipeingredient
+    BEGIN
+        UPDATE fridge_recipe_fts SET ingredients = (
+            SELECT coalesce(group_concat(text, ' '), '')
+            FROM fridge_recipeingredient WHERE recipe_id = old.recipe_id)
+        WHERE rowid = old.recipe_id;
+    END""",
+]
+
+
+def make_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in LINE_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+def parse_lines(apps, schema_editor):
+    """Fill the parsed fields of existing lines"""
+    from fridge.ingredient_parser import parse_line
+    RecipeIngredient = apps.get_model('fridge', 'RecipeIngredient')
+    for line in RecipeIngredient.objects.iterator():
+        parsed = parse_line(line.text)
+        metric_quantity, metric_unit = parsed.metric or (None, '')
+        RecipeIngredient.objects.filter(id=line.id).update(
+            name=parsed.name[:200], quantity=parsed.quantity,
+            unit=parsed.unit or '', metric_quantity=metric_quantity,
+            metric_unit=metric_unit)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fridge', '0007_coverage'),
+    ]
+
+    operations = [
+        # unapplying the fields drops the triggers too
+        migrations.RunPython(migrations.RunPython.noop, make_triggers),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='metric_quantity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='metric_unit',
+            field=models.CharField(blank=True, default='', max_length=2),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='quantity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='unit',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.RunPython(make_triggers, migrations.RunPython.noop),
+        migrations.RunPython(parse_lines, migrations.RunPython.noop),
+    ]
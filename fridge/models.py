@@ -7,7 +7,9 @@ based on changes you make to your models.py files.
 A new field requires a new migration.
 """
 
-from django.db import models
+import re
+
+from django.db import connection, models
 
 
 # Create your models here.
@@ -22,3 +24,92 @@ class Item(models.Model):
     text = models.TextField(default='')
     # link list to item by foreign key
     list = models.ForeignKey(List, default=None)
+    # catalogue ingredients the item text matches, see fridge.coverage
+    ingredients = models.ManyToManyField('Ingredient', blank=True)
+
+
+class Ingredient(models.Model):
+    """Model for catalogue ingredient from ingredients.json"""
+    name = models.CharField(max_length=200, unique=True)
+    category = models.CharField(max_length=100, default='', db_index=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeQuerySet(models.QuerySet):
+    def search(self, query, limit=20):
+        """Full text search of recipe names and ingredient lines
+        Uses the fridge_recipe_fts index on SQLite, best matches first
+        """
+        words = re.findall(r'\w+', query)
+        if not words:
+            return []
+        if connection.vendor != 'sqlite':
+            # no full text index, fall back to a scan of names
+            return list(self.filter(name__icontains=query)[:limit])
+        # quote words so user input is never fts query syntax,
+        # last word is a prefix as it may not be typed in full yet
+        match = ' '.join(f'"{word}"' for word in words) + '*'
+        return list(self.raw(
+            'SELECT fridge_recipe.* FROM fridge_recipe '
+            'JOIN fridge_recipe_fts ON fridge_recipe.id = fridge_recipe_fts.rowid '
+            'WHERE fridge_recipe_fts MATCH %s '
+            'ORDER BY bm25(fridge_recipe_fts) LIMIT %s', [match, limit]))
+
+
+class Recipe(models.Model):
+    """Model for scraped recipe
+    Name and ingredient lines are also in the fridge_recipe_fts
+    full text index, kept up to date by triggers
+    """
+    name = models.CharField(max_length=300, unique=True)
+    url = models.URLField(max_length=500, default='', blank=True)
+    # category path joined by /, paths of a recipe in several joined by ;
+    category = models.TextField(default='', blank=True)
+    # distinct catalogue ingredients of the lines
+    ingredient_count = models.PositiveIntegerField(default=0)
+
+    objects = RecipeQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeIngredient(models.Model):
+    """Model for an ingredient line of a recipe"""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='lines')
+    # catalogue ingredient matching the line, if any,
+    # a line matching several has a row for each
+    ingredient = models.ForeignKey(Ingredient, null=True, blank=True,
+                                   on_delete=models.SET_NULL)
+    text = models.TextField()
+    # parsed text, see fridge.ingredient_parser
+    name = models.CharField(max_length=200, default='', blank=True)
+    quantity = models.FloatField(null=True, blank=True)
+    unit = models.CharField(max_length=20, default='', blank=True)
+    # quantity in g or ml when the line gives or implies one
+    metric_quantity = models.FloatField(null=True, blank=True)
+    metric_unit = models.CharField(max_length=2, default='', blank=True)
+
+    class Meta:
+        # recipes using an ingredient without reading the rows
+        index_together = [('ingredient', 'recipe')]
+
+
+class ListRecipeCoverage(models.Model):
+    """Model for how many ingredients of a recipe a list has
+    Only recipes sharing an ingredient with the list have a row.
+    Kept up to date by fridge.coverage as items are added and removed.
+    """
+    list = models.ForeignKey(List, on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    covered = models.PositiveIntegerField()
+    # recipe ingredients the list does not have
+    missing = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [('list', 'recipe')]
+        # recipes missing n ingredients, most covered first
+        index_together = [('list', 'missing', 'covered')]
@@ -0,0 +1,88 @@
+"""Rank recipes by how many of their ingredients are in a fridge list
+Each recipe ingredient line is reduced to a key:
+    the catalogue names it matches, e.g. Vegetables/Garlic
+    or its normalized parsed name if it matches none
+List items are reduced to keys the same way.
+
+An inverted index maps each key to the recipes needing it, so ranking
+only touches the recipes sharing a key with the list,
+not every recipe in the corpus.
+"""
+
+import collections
+import functools
+import heapq
+
+from django.conf import settings
+
+from fridge.canonical import CatalogueIndex, name_key
+from fridge.corpus import load_ingredients, load_recipes
+from fridge.ingredient_parser import parse_lines, parse_line
+
+
+RankedRecipe = collections.namedtuple(
+    'RankedRecipe', ['name', 'url', 'covered', 'total', 'missing'])
+
+
+class RecipeRanker:
+    """Inverted index from ingredient key to recipes"""
+
+    def __init__(self, recipes, catalogue):
+        self.catalogue = catalogue
+        self.recipes = []
+        # ingredient keys of each recipe, by recipe id
+        self.recipe_keys = []
+        self.postings = collections.defaultdict(list)
+        lines = [line for recipe in recipes for line in recipe['ingredients']]
+        parsed = dict(zip(lines, parse_lines(lines)))
+        for recipe_id, recipe in enumerate(recipes):
+            keys = set()
+            for line in recipe['ingredients']:
+                keys.update(self.line_keys(parsed[line].name))
+            self.recipes.append((recipe['name'], recipe.get('url')))
+            self.recipe_keys.append(keys)
+            for key in keys:
+                self.postings[key].append(recipe_id)
+
+    def line_keys(self, name):
+        """Get ingredient keys for an ingredient name"""
+        matches = self.catalogue.match(name)
+        if matches:
+            return matches
+        key = name_key(name)
+        return [key] if key else []
+
+    def item_keys(self, items):
+        """Get set of ingredient keys for list item texts"""
+        return {key for item in items
+                for key in self.line_keys(parse_line(item).name)}
+
+    def rank(self, items, limit=20):
+        """Get best covered recipes for list item texts
+        Recipes are ranked by fraction of ingredients covered
+        then by number covered
+        """
+        keys = self.item_keys(items)
+        # sparse count of covered ingredients per recipe
+        covered = collections.Counter()
+        for key in keys:
+            covered.update(self.postings.get(key, ()))
+        best = heapq.nlargest(
+            limit, covered.items(),
+            key=lambda item: (item[1] / len(self.recipe_keys[item[0]]),
+                              item[1]))
+        ranked = []
+        for recipe_id, count in best:
+            name, url = self.recipes[recipe_id]
+            recipe_keys = self.recipe_keys[recipe_id]
+            ranked.append(RankedRecipe(name, url, count, len(recipe_keys),
+                                       sorted(recipe_keys - keys)))
+        return ranked
+
+
+@functools.lru_cache(maxsize=None)
+def get_ranker():
+    """Get the ranker for the configured corpus, built once per process"""
+    return RecipeRanker(load_recipes(settings.RECIPES_PATH),
+                        CatalogueIndex(load_ingredients(
+                            settings.INGREDIENTS_PATH)))
@@ -0,0 +1,105 @@
+"""Consolidated shopping list for a set of recipes
+Lines of the chosen recipes are merged by ingredient, the catalogue
+ingredient they match or else their normalized name, and their
+amounts are summed by kind:
+    weights in g and volumes in ml from the parsed metric quantity,
+        so 2 fl oz (55 ml) and 1 tablespoon add up
+    other units, like cloves or tins, by unit
+    plain counts, like 2 onions
+Lines without a quantity, like salt, only list the ingredient.
+
+Items of a fridge list are taken away from the amounts of the same
+kind. An item without a quantity counts as having enough.
+
+Lines are parsed when recipes are imported, so building a list is
+one query and dictionary aggregation, however many recipes.
+"""
+
+import collections
+
+from fridge.canonical import name_key
+from fridge.ingredient_parser import parse_line
+from fridge.models import Item, RecipeIngredient
+
+
+ShoppingItem = collections.namedtuple(
+    'ShoppingItem', ['name', 'amounts', 'recipes'])
+
+# larger units for display
+LARGER_UNITS = {'g': 'kg', 'ml': 'l'}
+
+
+def amount_of(quantity, unit, metric_quantity, metric_unit):
+    """Get (kind, quantity) of a parsed line, (None, None) if unmeasured
+    kind is 'g' or 'ml', another unit, or '' for a plain count
+    """
+    if metric_quantity is not None:
+        return metric_unit, metric_quantity
+    if quantity is not None:
+        return unit or '', quantity
+    return None, None
+
+
+def format_amount(kind, quantity):
+    """Get display text of an amount, e.g. 1.5 kg, 2 clove, 3"""
+    if kind in LARGER_UNITS and quantity >= 1000:
+        kind, quantity = LARGER_UNITS[kind], quantity / 1000
+    number = f'{round(quantity, 2):g}'
+    return f'{number} {kind}' if kind else number
+
+
+def fridge_amounts(list_):
+    """Get {key: {kind: quantity}} of the items of a list
+    kind None means an unmeasured item, enough of any amount
+    """
+    links = collections.defaultdict(list)
+    for item_id, ingredient_id in Item.ingredients.through.objects.filter(
+            item__list=list_).values_list('item_id', 'ingredient_id'):
+        links[item_id].append(ingredient_id)
+    have = collections.defaultdict(collections.Counter)
+    for item_id, text in list_.item_set.values_list('id', 'text'):
+        parsed = parse_line(text)
+        kind, quantity = amount_of(parsed.quantity, parsed.unit,
+                                   *(parsed.metric or (None, '')))
+        for key in links[item_id] or [name_key(parsed.name)]:
+            have[key][kind] += quantity or 0
+    return have
+
+
+def shopping_list(recipe_ids, list_=None):
+    """Get sorted list of ShoppingItem for recipes by id
+    less what the fridge list list_ has
+    """
+    needed = {}
+    lines = RecipeIngredient.objects.filter(recipe_id__in=recipe_ids) \
+        .values_list('recipe__name', 'ingredient_id', 'ingredient__name',
+                     'name', 'quantity', 'unit', 'metric_quantity',
+                     'metric_unit')
+    for recipe, ingredient_id, ingredient, name, *amount in lines:
+        key = ingredient_id if ingredient_id is not None else name_key(name)
+        if key is None:
+            continue
+        if key not in needed:
+            needed[key] = (ingredient or name, collections.Counter(), set())
+        kind, quantity = amount_of(*amount)
+        if kind is not None:
+            needed[key][1][kind] += quantity
+        needed[key][2].add(recipe)
+
+    have = fridge_amounts(list_) if list_ is not None else {}
+    shopping = []
+    for key, (name, amounts, recipes) in needed.items():
+        if key in have:
+            if None in have[key]:
+                continue
+            amounts = {kind: quantity - have[key][kind]
+                       for kind, quantity in amounts.items()
+                       if quantity > have[key][kind]}
+            # had every amount needed
+            if not amounts:
+                continue
+        shopping.append(ShoppingItem(
+            name, [format_amount(kind, quantity)
+                   for kind, quantity in sorted(amounts.items())],
+            sorted(recipes)))
+    return sorted(shopping, key=lambda item: item.name.lower())
@@ -0,0 +1,29 @@
+"""SQLite pragmas applied to every new database connection
+Pragmas come from settings.SQLITE_PRAGMAS, a dictionary of name: value:
+    journal_mode wal lets readers run while a writer commits
+    synchronous normal syncs at checkpoints instead of every commit,
+        safe with wal
+    cache_size negative is KiB of page cache per connection
+    mmap_size bytes of the database file read through memory mapping
+    busy_timeout milliseconds a writer waits for the lock
+        before "database is locked"
+Connections are kept between requests with CONN_MAX_AGE,
+so the pragmas are paid once per connection, not per request.
+"""
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Run the configured pragmas on a new sqlite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        # straight on the sqlite connection, so it is not logged as a query
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def connect_signals():
+    connection_created.connect(apply_pragmas,
+                               dispatch_uid='sqlite_tuning_pragmas')
@@ -60,13 +60,50 @@ Technically a test that relies on an external system, e.g. a database,
 is called an integrated test.
 """
 
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings)
 # from django.http import HttpRequest
 
-from fridge.models import Item, List
+from fridge import coverage, list_cache, metrics
+from fridge.autocomplete import PrefixIndex
+from fridge.canonical import CatalogueIndex, canonicalize_corpus
+from fridge.corpus_store import CorpusStore, convert
+from fridge.ingredient_parser import parse_corpus, parse_line
+from fridge.management.commands import import_catalogue
+from fridge.models import (
+    Ingredient, Item, List, ListRecipeCoverage, Recipe, RecipeIngredient)
+from fridge.recipe_ranking import RecipeRanker
+from fridge.shopping import ShoppingItem, shopping_list
 
 
-class HomePageTest(TestCase):
+# tests never touch the project's file cache in .fridge_cache
+use_local_cache = override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+
+@use_local_cache
+class ListCacheTestCase(TestCase):
+    """TestCase of views starting with an empty cache of their own
+    List pages are cached by list id, and a rolled back test leaves
+    its entries for the next test to reuse its ids
+    """
+
+    def setUp(self):
+        cache.clear()
+
+
+class HomePageTest(ListCacheTestCase):
 
     """ Old test
     def test_root_url_resolves_to_home_page_view(self):
@@ -98,7 +135,7 @@ class HomePageTest(TestCase):
         self.assertEqual(Item.objects.count(), 0)
 
 
-class NewListTest(TestCase):
+class NewListTest(ListCacheTestCase):
     def test_can_save_a_POST_request(self):
         """To do a POST, call self.client.post.
         It takes a data argument which contains the form data we want to send.
@@ -150,7 +187,55 @@ class NewListTest(TestCase):
         self.assertRedirects(response, f'/fridge/{correct_list.id}/')
 
 
-class ListViewTest(TestCase):
+class BatchItemsTest(ListCacheTestCase):
+
+    def test_adds_newline_separated_items(self):
+        list_ = List.objects.create()
+        response = self.client.post(f'/fridge/{list_.id}/add_items',
+                                    data={'item_text': 'milk\n\n eggs \n'})
+        self.assertRedirects(response, f'/fridge/{list_.id}/')
+        self.assertEqual(
+            list(list_.item_set.values_list('text', flat=True)),
+            ['milk', 'eggs'])
+
+    def test_creates_list_from_json_array(self):
+        response = self.client.post('/fridge/new_items',
+                                    data=json.dumps(['milk', 'eggs']),
+                                    content_type='application/json')
+        list_ = List.objects.get()
+        self.assertEqual(response.json(), {'list': list_.id, 'added': 2})
+        self.assertEqual(list_.item_set.count(), 2)
+
+    def test_rejects_invalid_batches(self):
+        list_ = List.objects.create()
+        for body in ['[1, 2]', '{"text": "milk"}', '[]', 'milk']:
+            response = self.client.post(f'/fridge/{list_.id}/add_items',
+                                        data=body,
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/fridge/new_items',
+                                    data={'item_text': ' \n '})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Item.objects.count(), 0)
+        self.assertEqual(List.objects.count(), 1)
+
+    def test_only_json_skips_csrf_check(self):
+        client = Client(enforce_csrf_checks=True)
+        list_ = List.objects.create()
+        item = Item.objects.create(text='milk', list=list_)
+        # as a form on another site would post
+        for url in ['/fridge/new_items', f'/fridge/{list_.id}/add_items',
+                    f'/fridge/{list_.id}/items/{item.id}/delete']:
+            response = client.post(url, data={'item_text': 'eggs'})
+            self.assertEqual(response.status_code, 403)
+        response = client.post(f'/fridge/{list_.id}/add_items',
+                               data=json.dumps(['eggs']),
+                               content_type='application/json')
+        self.assertEqual(response.json(), {'list': list_.id, 'added': 1})
+        self.assertEqual(Item.objects.count(), 2)
+
+
+class ListViewTest(ListCacheTestCase):
 
     def test_uses_list_template(self):
         # create a new list
@@ -194,6 +279,339 @@ class ListViewTest(TestCase):
         self.assertEqual(response.context['list'], correct_list)
 
 
+class ListPagingTest(ListCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.list_ = List.objects.create()
+        Item.objects.bulk_create(Item(text=f'item {i}', list=self.list_)
+                                 for i in range(1, 251))
+
+    def next_page(self, response):
+        link = re.search(r'id="id_next_page" href="([^"]*)"',
+                         response.content.decode())
+        return link and link.group(1).replace('&amp;', '&')
+
+    def test_pages_items_by_id(self):
+        response = self.client.get(f'/fridge/{self.list_.id}/')
+        self.assertContains(response, '100: item 100<')
+        self.assertNotContains(response, 'item 101<')
+        response = self.client.get(
+            f'/fridge/{self.list_.id}/' + self.next_page(response))
+        self.assertContains(response, '101: item 101<')
+        response = self.client.get(
+            f'/fridge/{self.list_.id}/' + self.next_page(response))
+        self.assertContains(response, '250: item 250<')
+        self.assertIsNone(self.next_page(response))
+
+    def test_streams_csv_and_jsonl_exports(self):
+        response = self.client.get(f'/fridge/{self.list_.id}/export.csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 250)
+        self.assertEqual(lines[0], 'item 1')
+        response = self.client.get(f'/fridge/{self.list_.id}/export.jsonl')
+        records = [json.loads(line) for line in
+                   b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(records[-1], {'text': 'item 250'})
+
+    def test_export_of_missing_list_is_404(self):
+        response = self.client.get('/fridge/999/export.csv')
+        self.assertEqual(response.status_code, 404)
+
+
+# versions are bumped on commit, which TestCase never does
+@use_local_cache
+class ListCacheTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.list_ = List.objects.create()
+        Item.objects.create(text='milk', list=self.list_)
+        self.url = f'/fridge/{self.list_.id}/'
+
+    def test_cached_page_needs_no_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, '1: milk')
+
+    def test_item_writes_invalidate_page(self):
+        self.client.get(self.url)
+        self.client.post(self.url + 'add_item', data={'item_text': 'eggs'})
+        self.assertContains(self.client.get(self.url), '2: eggs')
+        self.client.post(self.url + 'add_items', data={'item_text': 'ham'})
+        self.assertContains(self.client.get(self.url), '3: ham')
+        Item.objects.filter(text='milk').get().delete()
+        self.assertNotContains(self.client.get(self.url), 'milk')
+
+    def test_answers_matching_etag_with_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Item.objects.create(text='eggs', list=self.list_)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_bumps_version_when_write_commits(self):
+        version = list_cache.get_version(self.list_.id)
+        with transaction.atomic():
+            Item.objects.create(text='eggs', list=self.list_)
+            self.assertEqual(list_cache.get_version(self.list_.id), version)
+        self.assertNotEqual(list_cache.get_version(self.list_.id), version)
+
+
+class SqliteTuningTest(TestCase):
+
+    def test_applies_configured_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            # normal
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTest(ListCacheTestCase):
+
+    def get_metrics(self, token='secret'):
+        return self.client.get('/metrics',
+                               HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def sql_queries(self, view):
+        histogram = metrics.registry.histograms['fridge_sql_queries'].get(
+            view)
+        return (sum(histogram.counts), histogram.sum) if histogram else (0, 0)
+
+    def test_serves_view_histograms(self):
+        list_ = List.objects.create()
+        self.client.get(f'/fridge/{list_.id}/')
+        response = self.get_metrics()
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4')
+        text = response.content.decode()
+        self.assertIn('# TYPE fridge_view_seconds histogram', text)
+        self.assertIn('fridge_sql_queries_bucket{view="view_list",le="+Inf"}',
+                      text)
+        self.assertIn('fridge_template_seconds_count{view="view_list"}', text)
+
+    def test_metrics_need_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.get_metrics('wrong').status_code, 403)
+        User.objects.create_user('staff', password='pass', is_staff=True)
+        self.client.login(username='staff', password='pass')
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_counts_queries_without_keeping_their_sql(self):
+        list_ = List.objects.create()
+        Item.objects.create(text='milk', list=list_)
+        requests, queries = self.sql_queries('view_list')
+        logged = len(connection.queries_log)
+        self.client.get(f'/fridge/{list_.id}/')
+        self.assertEqual(len(connection.queries_log), logged)
+        new_requests, new_queries = self.sql_queries('view_list')
+        self.assertEqual(new_requests, requests + 1)
+        self.assertGreater(new_queries, queries)
+
+    def test_records_streamed_response_when_closed(self):
+        list_ = List.objects.create()
+        Item.objects.create(text='milk', list=list_)
+        requests, queries = self.sql_queries('export_list')
+        response = self.client.get(f'/fridge/{list_.id}/export.csv')
+        self.assertEqual(self.sql_queries('export_list'), (requests, queries))
+        b''.join(response.streaming_content)
+        new_requests, new_queries = self.sql_queries('export_list')
+        self.assertEqual(new_requests, requests + 1)
+        # the list lookup and the item chunk read while streaming
+        self.assertGreaterEqual(new_queries, queries + 2)
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=0)
+    def test_logs_slow_requests_with_queries(self):
+        list_ = List.objects.create()
+        with self.assertLogs('fridge.metrics', 'WARNING') as logs:
+            self.client.get(f'/fridge/{list_.id}/recipes')
+        self.assertIn(f'Slow request GET /fridge/{list_.id}/recipes',
+                      logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class AutocompleteTest(ListCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.index = PrefixIndex({
+            'Vegetables': ['Cherry Tomatoes', 'Onion'],
+            'Fruits': ['Tomato'],
+            'Other Ingredients': ['Tomato Purée']})
+
+    def test_completes_from_any_word_start(self):
+        self.assertEqual(self.index.complete('tom'), [
+            ('Tomato', 'Fruits'), ('Tomato Purée', 'Other Ingredients'),
+            ('Cherry Tomatoes', 'Vegetables')])
+        self.assertEqual(self.index.complete('Cherry  TOM'),
+                         [('Cherry Tomatoes', 'Vegetables')])
+        self.assertEqual(self.index.complete('puree'),
+                         [('Tomato Purée', 'Other Ingredients')])
+
+    def test_falls_back_to_longest_prefix(self):
+        self.assertEqual(self.index.complete('tomatos', 1),
+                         [('Tomato', 'Fruits')])
+        self.assertEqual(self.index.complete('ox'), [])
+        self.assertEqual(self.index.complete(''), [])
+
+    def test_view_returns_cacheable_json(self):
+        response = self.client.get('/fridge/autocomplete',
+                                   data={'q': 'garl', 'limit': 1})
+        self.assertEqual(response.json(), {
+            'query': 'garl',
+            'results': [{'name': 'Garlic', 'category': 'Vegetables'}]})
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+
+class CoverageTest(ListCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ingredients = {name: Ingredient.objects.create(name=name)
+                       for name in ['Garlic', 'Butter', 'Onion']}
+        recipes = {'Garlic butter': ['Garlic', 'Butter'],
+                   'Onion soup': ['Onion', 'Butter', 'Garlic']}
+        for name, recipe_ingredients in recipes.items():
+            recipe = Recipe.objects.create(
+                name=name, ingredient_count=len(recipe_ingredients))
+            for ingredient in recipe_ingredients:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, text=f'1 {ingredient.lower()}',
+                    ingredient=ingredients[ingredient])
+            RecipeIngredient.objects.create(recipe=recipe, text='salt')
+        # clearing the cache changes the catalogue version
+        self.list_ = List.objects.create()
+
+    def add(self, text):
+        self.client.post(f'/fridge/{self.list_.id}/add_item',
+                         data={'item_text': text})
+
+    def coverage(self):
+        return {row.recipe.name: (row.covered, row.missing)
+                for row in ListRecipeCoverage.objects.filter(list=self.list_)}
+
+    def test_counts_ingredients_as_items_are_added(self):
+        self.add('2 cloves garlic')
+        self.assertEqual(self.coverage(), {'Garlic butter': (1, 1),
+                                           'Onion soup': (1, 2)})
+        self.client.post(f'/fridge/{self.list_.id}/add_items',
+                         data={'item_text': 'butter\nmore garlic\ncheese'})
+        self.assertEqual(self.coverage(), {'Garlic butter': (2, 0),
+                                           'Onion soup': (2, 1)})
+
+    def test_uncovers_ingredient_when_last_item_goes(self):
+        self.add('garlic')
+        self.add('crushed garlic')
+        first, second = self.list_.item_set.order_by('id')
+        self.client.post(f'/fridge/{self.list_.id}/items/{first.id}/delete')
+        self.assertEqual(self.coverage()['Onion soup'], (1, 2))
+        self.client.post(f'/fridge/{self.list_.id}/items/{second.id}/delete')
+        self.assertEqual(self.coverage(), {})
+        self.assertEqual(self.list_.item_set.count(), 0)
+
+    def test_sees_ingredients_added_by_another_process(self):
+        self.add('garlic')
+        # as import_catalogue would, through the shared cache
+        cheese = Ingredient.objects.create(name='Cheese')
+        toast = Recipe.objects.create(name='Cheese toast', ingredient_count=1)
+        RecipeIngredient.objects.create(recipe=toast, text='cheese',
+                                        ingredient=cheese)
+        coverage.catalogue_changed()
+        self.add('cheese')
+        self.assertEqual(self.coverage()['Cheese toast'], (1, 0))
+
+    def test_catalogue_is_reused_without_queries(self):
+        coverage.get_catalogue()
+        with self.assertNumQueries(0):
+            coverage.item_ingredient_ids('garlic')
+
+    @mock.patch('fridge.coverage.MAX_VARIABLES', 9)
+    def test_changes_coverage_in_chunks(self):
+        # two ingredients a statement
+        self.add('garlic and butter and onions')
+        self.assertEqual(self.coverage(), {'Garlic butter': (2, 0),
+                                           'Onion soup': (3, 0)})
+        item, = self.list_.item_set.all()
+        self.client.post(f'/fridge/{self.list_.id}/items/{item.id}/delete')
+        self.assertEqual(self.coverage(), {})
+
+    def test_rebuild_matches_incremental_coverage(self):
+        for text in ['garlic', 'onions', 'butter']:
+            self.add(text)
+        before = self.coverage()
+        coverage.rebuild(self.list_)
+        self.assertEqual(self.coverage(), before)
+
+    def test_cookable_view_shows_recipes_missing_none_or_one(self):
+        self.add('garlic')
+        self.add('butter')
+        response = self.client.get(f'/fridge/{self.list_.id}/cookable')
+        self.assertTemplateUsed(response, 'cookable.html')
+        cookable = response.context['cookable']
+        self.assertEqual([row.recipe.name for row in cookable],
+                         ['Garlic butter'])
+        missing_one = response.context['missing_one']
+        self.assertEqual(
+            [(row.recipe.name, row.needed) for row in missing_one],
+            [('Onion soup', 'Onion')])
+
+
+class ShoppingListTest(ListCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        garlic = Ingredient.objects.create(name='Garlic')
+        self.recipes = []
+        for name, lines in [
+                ('Onion soup', ['2 fl oz (55 ml) milk', '2 onions',
+                                '1 clove garlic', 'salt']),
+                ('Garlic bread', ['3 cloves garlic', '1 tablespoon milk',
+                                  '2 oz butter', '1 onion'])]:
+            recipe = Recipe.objects.create(name=name)
+            self.recipes.append(recipe.id)
+            for parsed in map(parse_line, lines):
+                metric_quantity, metric_unit = parsed.metric or (None, '')
+                RecipeIngredient.objects.create(
+                    recipe=recipe, text=parsed.text, name=parsed.name,
+                    quantity=parsed.quantity, unit=parsed.unit or '',
+                    metric_quantity=metric_quantity, metric_unit=metric_unit,
+                    ingredient=garlic if parsed.name == 'garlic' else None)
+
+    def test_merges_lines_across_recipes_by_kind(self):
+        self.assertEqual(shopping_list(self.recipes), [
+            ShoppingItem('butter', ['56.7 g'], ['Garlic bread']),
+            ShoppingItem('Garlic', ['4 clove'],
+                         ['Garlic bread', 'Onion soup']),
+            ShoppingItem('milk', ['70 ml'], ['Garlic bread', 'Onion soup']),
+            ShoppingItem('onions', ['3'], ['Garlic bread', 'Onion soup']),
+            ShoppingItem('salt', [], ['Onion soup']),
+        ])
+
+    def test_takes_away_fridge_list_items(self):
+        list_ = List.objects.create()
+        for text in ['1 onion', '100 ml milk', 'butter', 'salt']:
+            Item.objects.create(text=text, list=list_)
+        self.assertEqual(shopping_list(self.recipes, list_), [
+            ShoppingItem('Garlic', ['4 clove'],
+                         ['Garlic bread', 'Onion soup']),
+            ShoppingItem('onions', ['2'], ['Garlic bread', 'Onion soup']),
+        ])
+
+    def test_shopping_view_lists_chosen_recipes(self):
+        list_ = List.objects.create()
+        response = self.client.get(f'/fridge/{list_.id}/shopping',
+                                   data={'recipe': self.recipes[:1]})
+        self.assertTemplateUsed(response, 'shopping.html')
+        self.assertEqual([item.name for item in response.context['shopping']],
+                         ['Garlic', 'milk', 'onions', 'salt'])
+
+
 class ListAndItemModelsTest(TestCase):
     """Testing with Object-Relational Mapper (ORM)
     ORM is a layer of abstraction for data stored in
@@ -241,3 +659,295 @@ class ListAndItemModelsTest(TestCase):
                          'Item the second')
         # check item is assigned to list
         self.assertEqual(second_saved_item.list, list_)
+
+
+class IngredientParserTest(TestCase):
+
+    def test_parses_quantity_unit_and_metric_equivalent(self):
+        line = parse_line('2 fl oz (55 ml) Worcestershire sauce')
+        self.assertEqual(line.quantity, 2.0)
+        self.assertEqual(line.unit, 'fl oz')
+        self.assertEqual(line.metric, (55.0, 'ml'))
+        self.assertEqual(line.name, 'Worcestershire sauce')
+
+    def test_parses_compound_imperial_quantities(self):
+        line = parse_line('1 lb 2 oz (500 g) potatoes')
+        self.assertEqual(line.quantity, 1.125)
+        self.assertEqual(line.unit, 'lb')
+        self.assertEqual(line.metric, (500.0, 'g'))
+        self.assertEqual(line.name, 'potatoes')
+        # without a metric amount the sum is converted
+        line = parse_line('1 pint 5 fl oz milk')
+        self.assertEqual(line.quantity, 1.25)
+        self.assertEqual(line.metric, (710.0, 'ml'))
+        self.assertEqual(line.name, 'milk')
+
+    def test_separates_modifiers_from_name(self):
+        line = parse_line('1 level tablespoon grated fresh ginger')
+        self.assertEqual(line.unit, 'tablespoon')
+        # spoon measures are converted when no metric amount is given
+        self.assertEqual(line.metric, (15.0, 'ml'))
+        self.assertEqual(line.modifiers, ('level', 'grated', 'fresh'))
+        self.assertEqual(line.name, 'ginger')
+
+    def test_parses_lines_without_quantity(self):
+        line = parse_line('freshly milled black pepper')
+        self.assertIsNone(line.quantity)
+        self.assertIsNone(line.unit)
+        self.assertEqual(line.name, 'black pepper')
+
+    def test_fraction_over_zero_is_not_a_quantity(self):
+        line = parse_line('3/0 cups flour')
+        self.assertIsNone(line.quantity)
+        self.assertEqual(line.name, '3/0 cups flour')
+        self.assertEqual(parse_line('1/2 pint milk').quantity, 0.5)
+
+    def test_parses_corpus_by_recipe(self):
+        recipes = [{'name': 'Grill', 'ingredients': ['1 clove garlic',
+                                                     '2 large apricots']},
+                   {'name': 'Toast', 'ingredients': ['1 clove garlic']}]
+        corpus = parse_corpus(recipes)
+        self.assertEqual([l.name for l in corpus['Grill']],
+                         ['garlic', 'apricots'])
+        # repeated lines give the same record
+        self.assertIs(corpus['Toast'][0], corpus['Grill'][0])
+
+
+class CanonicalIngredientTest(TestCase):
+
+    def setUp(self):
+        self.index = CatalogueIndex({
+            'Vegetables': ['Garlic', 'Cherry Tomatoes', 'Tomato'],
+            'Other Ingredients': ['Tomato Puree'],
+            'Spices and Herbs': ['Bay Leaf', 'Salt', 'Black Pepper'],
+        })
+
+    def test_matches_plurals_and_accents(self):
+        self.assertEqual(self.index.match('bay leaves'),
+                         ['Spices and Herbs/Bay Leaf'])
+        self.assertEqual(self.index.match('tomato purée'),
+                         ['Other Ingredients/Tomato Puree'])
+
+    def test_drops_matches_inside_longer_matches(self):
+        self.assertEqual(self.index.match('cherry tomatoes'),
+                         ['Vegetables/Cherry Tomatoes'])
+
+    def test_matches_several_or_no_names(self):
+        self.assertEqual(self.index.match('salt and black pepper'),
+                         ['Spices and Herbs/Black Pepper',
+                          'Spices and Herbs/Salt'])
+        self.assertEqual(self.index.match('Worcestershire sauce'), [])
+
+    def test_canonicalizes_corpus_lines_by_parsed_name(self):
+        recipes = [{'name': 'Grill', 'ingredients': ['1 clove garlic']}]
+        self.assertEqual(canonicalize_corpus(recipes, self.index),
+                         {'Grill': {'1 clove garlic': ['Vegetables/Garlic']}})
+
+
+class RecipeRankingTest(TestCase):
+
+    def setUp(self):
+        catalogue = CatalogueIndex({'Vegetables': ['Garlic', 'Onion'],
+                                    'Dairy Products': ['Milk', 'Butter']})
+        recipes = [
+            {'name': 'Garlic butter', 'url': None,
+             'ingredients': ['1 clove garlic', '4 oz (110 g) butter']},
+            {'name': 'Onion soup', 'url': None,
+             'ingredients': ['2 large onions', '1 pint milk', '1 oz butter',
+                             'salt']},
+        ]
+        self.ranker = RecipeRanker(recipes, catalogue)
+
+    def test_ranks_recipes_by_ingredients_covered(self):
+        ranked = self.ranker.rank(['Garlic', 'butter', 'onions'])
+        self.assertEqual([r.name for r in ranked],
+                         ['Garlic butter', 'Onion soup'])
+        self.assertEqual((ranked[1].covered, ranked[1].total), (2, 4))
+        self.assertEqual(ranked[1].missing, ['Dairy Products/Milk', 'salt'])
+
+    def test_leaves_out_recipes_without_list_ingredients(self):
+        self.assertEqual(self.ranker.rank(['cheese']), [])
+
+
+class RecipesViewTest(ListCacheTestCase):
+
+    def test_uses_recipes_template(self):
+        list_ = List.objects.create()
+        response = self.client.get(f'/fridge/{list_.id}/recipes')
+        self.assertTemplateUsed(response, 'recipes.html')
+
+    def test_ranks_recipes_for_list_items(self):
+        list_ = List.objects.create()
+        Item.objects.create(text='garlic', list=list_)
+        response = self.client.get(f'/fridge/{list_.id}/recipes')
+        # recipes.json recipe uses garlic
+        self.assertEqual(response.context['recipes'][0].covered, 1)
+
+
+class CorpusStoreTest(TestCase):
+
+    def setUp(self):
+        self.recipes = [
+            {'name': 'Onion soup', 'category': ['Soups'],
+             'ingredients': ['2 large onions', '1 pint milk'],
+             'url': 'http://deliaonline.com/recipes/onion-soup'},
+            {'name': 'Garlic butter', 'category': [],
+             'ingredients': ['1 clove garlic', '4 oz (110 g) butter'],
+             'url': None},
+            # merged from two listings by dedup_recipes.py
+            {'name': 'Cheese toast', 'category': ['Snacks'],
+             'categories': [['Snacks'], ['Quick', 'Toast']],
+             'ingredients': ['2 slices bread'], 'url': None},
+        ]
+        self.ingredients = {'Vegetables': ['Garlic', 'Onion'],
+                            'Dairy Products': ['Milk', 'Butter']}
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.path = os.path.join(work_dir.name, 'corpus.bin')
+        convert(self.recipes, self.ingredients, self.path)
+
+    def test_reads_back_recipes_and_ingredients(self):
+        store = CorpusStore(self.path)
+        self.assertEqual(list(store.iter_recipes()), self.recipes)
+        self.assertEqual(store.ingredients(), self.ingredients)
+
+    def test_finds_recipe_by_name(self):
+        store = CorpusStore(self.path)
+        self.assertEqual(store.find_recipe('Onion soup'), self.recipes[0])
+        self.assertIsNone(store.find_recipe('Pea soup'))
+
+
+class RecipeSearchTest(ListCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        garlic = Ingredient.objects.create(name='Garlic',
+                                           category='Vegetables')
+        grill = Recipe.objects.create(name='Mixed grill')
+        RecipeIngredient.objects.create(recipe=grill, text='1 clove garlic',
+                                        ingredient=garlic)
+        RecipeIngredient.objects.create(recipe=grill, text='6 pork ribs')
+        soup = Recipe.objects.create(name='Onion soup')
+        RecipeIngredient.objects.create(recipe=soup, text='2 large onions')
+
+    def test_searches_recipe_names_and_ingredient_lines(self):
+        self.assertEqual([r.name for r in Recipe.objects.search('soup')],
+                         ['Onion soup'])
+        # stemmed, so ribs matches rib
+        self.assertEqual([r.name for r in Recipe.objects.search('rib')],
+                         ['Mixed grill'])
+
+    def test_index_follows_deleted_lines_and_recipes(self):
+        RecipeIngredient.objects.filter(text='6 pork ribs').delete()
+        self.assertEqual(Recipe.objects.search('pork'), [])
+        self.assertEqual(len(Recipe.objects.search('garlic')), 1)
+        Recipe.objects.filter(name='Mixed grill').delete()
+        self.assertEqual(Recipe.objects.search('garlic'), [])
+
+    def test_ignores_fts_query_syntax(self):
+        self.assertEqual(Recipe.objects.search('"onion AND (soup'), [])
+
+    def test_search_view_shows_matching_recipes(self):
+        response = self.client.get('/fridge/search', data={'q': 'garlic'})
+        self.assertTemplateUsed(response, 'search.html')
+        self.assertContains(response, 'Mixed grill')
+        self.assertNotContains(response, 'Onion soup')
+
+
+class ImportCatalogueTest(TestCase):
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.recipes_path = os.path.join(work_dir.name, 'recipes.jsonl')
+        self.ingredients_path = os.path.join(work_dir.name, 'ingredients.json')
+        with open(self.ingredients_path, 'w') as f:
+            json.dump({'Vegetables': ['Garlic', 'Onion']}, f)
+
+    def import_recipes(self, recipes):
+        with open(self.recipes_path, 'w') as f:
+            for recipe in recipes:
+                f.write(json.dumps(recipe) + '\n')
+        call_command('import_catalogue', ingredients=self.ingredients_path,
+                     recipes=self.recipes_path, batch_size=1,
+                     stdout=io.StringIO())
+
+    def test_imports_recipes_with_matched_ingredients(self):
+        self.import_recipes([
+            {'name': 'Onion soup', 'category': ['Soups', 'Winter'],
+             'ingredients': ['2 large onions', '1 pint milk'],
+             'url': 'http://deliaonline.com/recipes/onion-soup'}])
+        recipe = Recipe.objects.get(name='Onion soup')
+        self.assertEqual(recipe.category, 'Soups/Winter')
+        self.assertEqual(recipe.ingredient_count, 1)
+        lines = recipe.lines.order_by('id')
+        self.assertEqual([line.text for line in lines],
+                         ['2 large onions', '1 pint milk'])
+        self.assertEqual(lines[0].ingredient.name, 'Onion')
+        self.assertIsNone(lines[1].ingredient)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_links_line_to_every_ingredient_it_matches(self):
+        soup = {'name': 'Onion soup', 'category': [],
+                'ingredients': ['1 onion and 1 clove garlic', '1 onion'],
+                'url': None}
+        self.import_recipes([soup])
+        recipe = Recipe.objects.get(name='Onion soup')
+        self.assertEqual(recipe.ingredient_count, 2)
+        lines = list(recipe.lines.order_by('id').values_list(
+            'text', 'ingredient__name'))
+        self.assertEqual(lines, [('1 onion and 1 clove garlic', 'Garlic'),
+                                 ('1 onion and 1 clove garlic', 'Onion'),
+                                 ('1 onion', 'Onion')])
+        # the rows read back as the same lines, so nothing is rewritten
+        ids = list(recipe.lines.values_list('id', flat=True))
+        self.import_recipes([soup])
+        self.assertEqual(list(recipe.lines.values_list('id', flat=True)), ids)
+
+    def test_imports_every_category_path_of_merged_recipes(self):
+        self.import_recipes([
+            {'name': 'Onion soup', 'category': ['Soups'],
+             'categories': [['Soups'], ['Seasons', 'Winter']],
+             'ingredients': ['2 large onions'], 'url': None}])
+        self.assertEqual(Recipe.objects.get(name='Onion soup').category,
+                         'Soups; Seasons/Winter')
+
+    def test_reimport_updates_recipes_by_name(self):
+        soup = {'name': 'Onion soup', 'category': [],
+                'ingredients': ['2 large onions'], 'url': None}
+        self.import_recipes([soup])
+        soup['ingredients'] = ['2 large onions', '1 clove garlic']
+        self.import_recipes([soup, {'name': 'Garlic butter', 'category': [],
+                                    'ingredients': ['1 clove garlic'],
+                                    'url': None}])
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertEqual(
+            Recipe.objects.get(name='Onion soup').lines.count(), 2)
+        self.assertEqual(Ingredient.objects.count(), 2)
+        self.assertEqual(len(Recipe.objects.search('garlic')), 2)
+
+    def test_index_triggers_work_after_import(self):
+        self.import_recipes([{'name': 'Onion soup', 'category': [],
+                              'ingredients': ['2 large onions'],
+                              'url': None}])
+        self.assertEqual(len(Recipe.objects.search('onions')), 1)
+        RecipeIngredient.objects.create(
+            recipe=Recipe.objects.get(name='Onion soup'), text='1 leek')
+        self.assertEqual(len(Recipe.objects.search('leek')), 1)
+
+    @mock.patch.object(import_catalogue, 'MAX_VARIABLES', 2)
+    def test_looks_up_large_batches_in_chunks(self):
+        recipes = [{'name': f'Soup {i}', 'category': [],
+                    'ingredients': [f'{i} onions'], 'url': None}
+                   for i in range(5)]
+        with open(self.recipes_path, 'w') as f:
+            for recipe in recipes:
+                f.write(json.dumps(recipe) + '\n')
+        call_command('import_catalogue', recipes=self.recipes_path,
+                     stdout=io.StringIO())
+        recipes[4]['ingredients'] = ['1 clove garlic']
+        self.import_recipes(recipes)
+        self.assertEqual(Recipe.objects.count(), 5)
+        self.assertEqual(RecipeIngredient.objects.count(), 5)
+        self.assertEqual([r.name for r in Recipe.objects.search('garlic')],
+                         ['Soup 4'])
@@ -19,9 +19,29 @@ from fridge import views
 urlpatterns = [
     # new list url
     url(r'^new$', views.new_list, name='new_list'),
+    # new list from a batch of items
+    url(r'^new_items$', views.new_list_items, name='new_list_items'),
+    # ingredient name completions
+    url(r'^autocomplete$', views.autocomplete, name='autocomplete'),
+    # full text recipe search
+    url(r'^search$', views.search_recipes, name='search_recipes'),
     # list url - capture any characters up to following /
     # pass to the view as an argument
     url(r'^(\d+)/$', views.view_list, name='view_list'),
     # add list item url
     url(r'^(\d+)/add_item$', views.add_item, name='add_item'),
+    # add a batch of list items
+    url(r'^(\d+)/add_items$', views.add_items, name='add_items'),
+    # remove a list item
+    url(r'^(\d+)/items/(\d+)/delete$', views.delete_item,
+        name='delete_item'),
+    # stream all list items
+    url(r'^(\d+)/export\.(csv|jsonl)$', views.export_list,
+        name='export_list'),
+    # recipes ranked for a list
+    url(r'^(\d+)/recipes$', views.view_recipes, name='view_recipes'),
+    # recipes a list covers or nearly covers
+    url(r'^(\d+)/cookable$', views.view_cookable, name='view_cookable'),
+    # shopping list for chosen recipes
+    url(r'^(\d+)/shopping$', views.view_shopping, name='view_shopping'),
 ]
\ No newline at end of file
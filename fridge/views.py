@@ -1,6 +1,23 @@
+import csv
+import functools
+import json
+
 # from django.http import HttpResponse
+from django.apps import apps
+from django.db import transaction
+from django.http import (
+    Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse)
 from django.shortcuts import redirect, render
-from fridge.models import Item, List
+from django.template.loader import render_to_string
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import etag, require_POST
+from fridge import coverage, list_cache
+from fridge.autocomplete import MAX_COMPLETIONS
+from fridge.models import (
+    Item, List, ListRecipeCoverage, Recipe, RecipeIngredient)
+from fridge.recipe_ranking import get_ranker
+from fridge.shopping import shopping_list
 
 
 def home_page(request):
@@ -21,25 +38,275 @@ def home_page(request):
 
 def new_list(request):
     """New list view page"""
-    # create new list
-    list_ = List.objects.create()
-    # create new item from post request and associate it with the list
-    Item.objects.create(text=request.POST['item_text'], list=list_)
+    with transaction.atomic():
+        # create new list
+        list_ = List.objects.create()
+        # create new item from post request and associate it with the list
+        item = Item.objects.create(text=request.POST['item_text'], list=list_)
+        coverage.add_items(list_, [item])
     return redirect(f'/fridge/{list_.id}/')
 
 
+# items shown on one page of a list
+PAGE_SIZE = 100
+# items read per query by exports
+EXPORT_CHUNK_SIZE = 1000
+
+
+def get_int(request, name):
+    """Get a non negative integer query parameter, 0 if missing or invalid"""
+    value = request.GET.get(name, '')
+    return int(value) if value.isdigit() else 0
+
+
+@etag(list_cache.list_etag)
 def view_list(request, list_id):
-    """View for a list"""
-    list_ = List.objects.get(id=list_id)
-    # render page with items from db
-    return render(request, 'list.html', {'list': list_})
+    """View for a list
+    Items are paged by id, ?after=<id> shows the page after an item,
+    so a page costs the same however long the list is.
+    ?start=<n> continues the item numbering from the previous page.
+
+    The rendered item table is cached until the list changes,
+    so a cached page does not touch the database.
+    """
+    after, start = get_int(request, 'after'), get_int(request, 'start')
+
+    def render_items():
+        list_ = List.objects.get(id=list_id)
+        # render page with items from db
+        items = list(list_.item_set.filter(id__gt=after)
+                     .order_by('id')[:PAGE_SIZE + 1])
+        context = {'list': list_, 'items': items[:PAGE_SIZE], 'start': start}
+        if len(items) > PAGE_SIZE:
+            context['next_after'] = items[PAGE_SIZE - 1].id
+            context['next_start'] = start + PAGE_SIZE
+        return render_to_string('list_items.html', context)
+
+    items_table = list_cache.get_or_set(list_id, f'items:{after}:{start}',
+                                        render_items)
+    # the list exists, its table was rendered, so it needs no query
+    return render(request, 'list.html',
+                  {'list': List(id=int(list_id)), 'items_table': items_table})
+
+
+def iter_item_texts(list_):
+    """Get texts of all items in a list, reading them in chunks by id
+    SQLite reads a whole queryset even with .iterator(),
+    so chunks keep memory constant.
+    """
+    after = 0
+    while True:
+        chunk = list(list_.item_set.filter(id__gt=after).order_by('id')
+                     .values_list('id', 'text')[:EXPORT_CHUNK_SIZE])
+        for after, text in chunk:
+            yield text
+        if len(chunk) < EXPORT_CHUNK_SIZE:
+            return
+
+
+class Echo:
+    """File like object returning what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def export_list(request, list_id, extension):
+    """Stream all items of a list as csv or jsonl"""
+    try:
+        list_ = List.objects.get(id=list_id)
+    except List.DoesNotExist:
+        raise Http404('No such list')
+    if extension == 'csv':
+        writer = csv.writer(Echo())
+        rows = (writer.writerow([text]) for text in iter_item_texts(list_))
+        content_type = 'text/csv'
+    else:
+        rows = (json.dumps({'text': text}) + '\n'
+                for text in iter_item_texts(list_))
+        content_type = 'application/x-ndjson'
+    response = StreamingHttpResponse(rows, content_type=content_type)
+    response['Content-Disposition'] = \
+        f'attachment; filename="fridge-{list_.id}.{extension}"'
+    return response
 
 def add_item(request, list_id):
-    """Add an item to a fridge list"""
+    """Add an item to a fridge list
+    Under wal a transaction that reads before it writes fails with
+    "database is locked" instead of waiting busy_timeout for a writer,
+    so writing views look up before their transaction and write first.
+    """
     list_ = List.objects.get(id=list_id)
-    # save new list item
-    Item.objects.create(text=request.POST['item_text'], list=list_)
+    with transaction.atomic():
+        # save new list item
+        item = Item.objects.create(text=request.POST['item_text'], list=list_)
+        coverage.add_items(list_, [item])
     return redirect(f'/fridge/{list_.id}/')
 
 
+@require_POST
+def delete_item(request, list_id, item_id):
+    """Remove an item from a fridge list"""
+    list_ = List.objects.get(id=list_id)
+    try:
+        item = list_.item_set.get(id=item_id)
+    except Item.DoesNotExist:
+        raise Http404('No such item')
+    # an item's links do not change, so they can be read before deleting
+    removed = coverage.ingredients_of([item])
+    with transaction.atomic():
+        item.delete()
+        coverage.remove_ingredients(list_, removed)
+    return redirect(f'/fridge/{list_.id}/')
+
+
+# most items accepted by one batch request
+MAX_BATCH_ITEMS = 500
+
+
+def csrf_exempt_json(view):
+    """Exempt json requests to a view from the csrf check, not forms
+    Mobile clients post json without a csrf token, and a cross site
+    form cannot send a json body
+    """
+    protected = csrf_protect(view)
+
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.content_type == 'application/json':
+            return view(request, *args, **kwargs)
+        return protected(request, *args, **kwargs)
+    return csrf_exempt(wrapped)
+
+
+def batch_item_texts(request):
+    """Get list of item texts from a batch request
+    Items are a json array body or a newline separated item_text field.
+    Raise ValueError if there are none, too many or not strings.
+    """
+    if request.content_type == 'application/json':
+        try:
+            texts = json.loads(request.body.decode('utf8'))
+        except ValueError:
+            raise ValueError('Body is not valid json')
+        if not isinstance(texts, list) or \
+                not all(isinstance(text, str) for text in texts):
+            raise ValueError('Body must be a json array of strings')
+    else:
+        texts = request.POST.get('item_text', '').splitlines()
+    texts = [text.strip() for text in texts if text.strip()]
+    if not texts:
+        raise ValueError('No items given')
+    if len(texts) > MAX_BATCH_ITEMS:
+        raise ValueError(f'At most {MAX_BATCH_ITEMS} items per request')
+    return texts
+
+
+def save_items(request, list_id=None):
+    """Add a batch of items to a list, a new one if list_id is None
+    Json requests get a json response, forms are redirected to the list.
+    """
+    try:
+        texts = batch_item_texts(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    # looked up before the transaction, which writes first, see add_item
+    if list_id is not None:
+        list_ = List.objects.get(id=list_id)
+    with transaction.atomic():
+        if list_id is None:
+            list_ = List.objects.create()
+        Item.objects.bulk_create(Item(text=text, list=list_)
+                                 for text in texts)
+        # bulk_create gives no ids on SQLite, the insert holds the write
+        # lock until commit, so the newest items of the list are these
+        items = list(list_.item_set.order_by('-id')[:len(texts)])
+        coverage.add_items(list_, items)
+    # bulk_create sends no signals to bump the list
+    list_cache.bump(list_.id)
+    if request.content_type == 'application/json':
+        return JsonResponse({'list': list_.id, 'added': len(texts)})
+    return redirect(f'/fridge/{list_.id}/')
+
+
+@csrf_exempt_json
+@require_POST
+def new_list_items(request):
+    """Create a list with a batch of items"""
+    return save_items(request)
+
+
+@csrf_exempt_json
+@require_POST
+def add_items(request, list_id):
+    """Add a batch of items to a fridge list in one insert"""
+    return save_items(request, list_id)
+
+
+def view_recipes(request, list_id):
+    """View recipes ranked by how many ingredients are in a list"""
+    list_ = List.objects.get(id=list_id)
+    items = list_cache.get_or_set(
+        list_id, 'texts',
+        lambda: list(list_.item_set.values_list('text', flat=True)))
+    recipes = get_ranker().rank(items)
+    return render(request, 'recipes.html',
+                  {'list': list_, 'recipes': recipes})
+
+
+def view_cookable(request, list_id):
+    """View recipes a list has every ingredient of or misses one of"""
+    list_ = List.objects.get(id=list_id)
+    rows = ListRecipeCoverage.objects.filter(list=list_) \
+        .select_related('recipe').order_by('-covered')
+    cookable = list(rows.filter(missing=0)[:PAGE_SIZE])
+    missing_one = list(rows.filter(missing=1)[:PAGE_SIZE])
+    # the ingredient each recipe missing one needs
+    needed = dict(RecipeIngredient.objects.filter(
+        recipe__in=[row.recipe_id for row in missing_one],
+        ingredient__isnull=False,
+    ).exclude(ingredient__item__list=list_).values_list(
+        'recipe_id', 'ingredient__name'))
+    for row in missing_one:
+        row.needed = needed.get(row.recipe_id)
+    return render(request, 'cookable.html', {
+        'list': list_, 'cookable': cookable, 'missing_one': missing_one})
+
+
+# most recipes in one shopping list
+MAX_SHOPPING_RECIPES = 200
+
+
+def view_shopping(request, list_id):
+    """View one shopping list for the recipes in ?recipe=<id>&recipe=...
+    less what the fridge list has
+    """
+    list_ = List.objects.get(id=list_id)
+    recipe_ids = [int(recipe_id) for recipe_id in request.GET.getlist('recipe')
+                  if recipe_id.isdigit()][:MAX_SHOPPING_RECIPES]
+    return render(request, 'shopping.html', {
+        'list': list_, 'recipes': Recipe.objects.filter(id__in=recipe_ids),
+        'shopping': shopping_list(recipe_ids, list_)})
+
+
+def search_recipes(request):
+    """Search recipes by name and ingredients with the full text index"""
+    query = request.GET.get('q', '')
+    recipes = Recipe.objects.search(query) if query else []
+    return render(request, 'search.html',
+                  {'query': query, 'recipes': recipes})
+
 
+# the catalogue only changes on restart
+@cache_control(public=True, max_age=3600)
+def autocomplete(request):
+    """Get json catalogue ingredients completing ?q=, at most ?limit="""
+    query = request.GET.get('q', '')
+    limit = min(get_int(request, 'limit') or MAX_COMPLETIONS,
+                MAX_COMPLETIONS)
+    index = apps.get_app_config('fridge').autocomplete
+    return JsonResponse({
+        'query': query,
+        'results': [{'name': name, 'category': category}
+                    for name, category in index.complete(query, limit)],
+    })
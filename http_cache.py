@@ -0,0 +1,171 @@
+"""Cached HTTP fetching for the scrapers
+Pages are fetched through one pooled keep-alive session and stored on disk
+keyed by url, with their ETag and Last-Modified headers.
+
+The next fetch of a cached url is a conditional GET:
+If the site answers 304 Not Modified the body is read from disk,
+otherwise the new body replaces the cached one.
+
+Cache directory is .http_cache unless SCRAPE_CACHE_DIR is set.
+If SCRAPE_RECORD_DIR is set every page is also saved to that archive,
+if SCRAPE_REPLAY_URL is set pages are fetched from that replay server.
+See replay.py
+
+Requests wait for a slot of their host's adaptive rate limiter,
+see rate_limit.py. A throttled or failed request is retried after the
+limiter lets it through again, up to MAX_ATTEMPTS times.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import rate_limit
+import replay
+
+
+CACHE_DIR = os.environ.get('SCRAPE_CACHE_DIR', '.http_cache')
+RECORD_DIR = os.environ.get('SCRAPE_RECORD_DIR')
+REPLAY_URL = os.environ.get('SCRAPE_REPLAY_URL')
+# seconds to wait for a server before giving up
+TIMEOUT = 30
+# tries of a request that is throttled or fails
+MAX_ATTEMPTS = 4
+
+# page returned by fetch, from_cache is True when the site answered 304
+Page = collections.namedtuple(
+    'Page', ['url', 'status_code', 'content', 'from_cache'])
+
+
+class HttpCache:
+    """On disk response cache in front of a pooled session"""
+
+    def __init__(self, cache_dir=CACHE_DIR, pool_size=16,
+                 record_dir=RECORD_DIR, replay_url=REPLAY_URL):
+        self.cache_dir = cache_dir
+        self.archive = replay.Archive(record_dir) if record_dir else None
+        self.replay_url = replay_url
+        os.makedirs(cache_dir, exist_ok=True)
+        # keep alive connections are reused for every request to a host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.stats = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+        """Get body and metadata file paths for a url"""
+        key = hashlib.sha256(url.encode('utf8')).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + '.body', base + '.json'
+
+    def _load(self, url):
+        """Get cached metadata and body for a url or None"""
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def _store(self, url, response):
+        """Save a response body and its validators"""
+        body_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        meta = {
+            'url': url,
+            'status_code': response.status_code,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        # write to temporary files then rename so readers never see
+        # a partly written entry
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(body_path + suffix, 'wb') as f:
+            f.write(response.content)
+        with open(meta_path + suffix, 'w') as f:
+            json.dump(meta, f)
+        os.replace(body_path + suffix, body_path)
+        os.replace(meta_path + suffix, meta_path)
+
+    def fetch(self, url):
+        """Get a page, recording it if there is an archive"""
+        page = self._fetch(url)
+        if self.archive:
+            self.archive.save(url, page.status_code, page.content)
+        return page
+
+    def _fetch(self, url):
+        """Get a page, revalidating any cached copy with a conditional GET"""
+        meta, body = self._load(url)
+        headers = {}
+        if meta:
+            if meta['etag']:
+                headers['If-None-Match'] = meta['etag']
+            if meta['last_modified']:
+                headers['If-Modified-Since'] = meta['last_modified']
+        if self.replay_url:
+            request_url = replay.to_replay_url(url, self.replay_url)
+        else:
+            request_url = url
+        response = self._get(request_url, headers)
+        if response.status_code == 304 and meta:
+            with self._lock:
+                self.stats['not_modified'] += 1
+            return Page(url, meta['status_code'], body, True)
+        with self._lock:
+            self.stats['downloaded'] += 1
+        if response.ok:
+            self._store(url, response)
+        return Page(url, response.status_code, response.content, False)
+
+    def _get(self, url, headers):
+        """Get a response within the rate limits of the url's host
+        Retry throttled and failed requests
+        """
+        limiter = rate_limit.get_scheduler().limiter(url)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            start = limiter.acquire()
+            try:
+                response = self.session.get(url, headers=headers,
+                                            timeout=TIMEOUT)
+            except requests.RequestException:
+                limiter.release(start)
+                if attempt == MAX_ATTEMPTS:
+                    raise
+            else:
+                limiter.release(start, response.status_code,
+                                response.headers.get('Retry-After'))
+                if attempt == MAX_ATTEMPTS \
+                        or not rate_limit.is_throttled(response.status_code):
+                    return response
+            with self._lock:
+                self.stats['retried'] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Get the cache shared by every scraper in this process"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
+
+
+def fetch(url):
+    """Get a page through the shared cache"""
+    return get_cache().fetch(url)
@@ -1,70 +1,109 @@
 """Make a dictionary of ingredients
 Scrape food.ndtv.com
 Store ingredients in a dictionary of lists arranged by categories
+Pages come through the on disk http cache
+
+Categories are scraped in parallel, each one page at a time
+until a page has no ingredients:
+
+    python ingredients.py --workers 20
+
+A page still failing after the http cache's retries raises ListingError
+rather than cutting its category short.
+
+Workers is an upper bound, the site's adaptive rate limit decides how
+many requests are in flight, see rate_limit.py
+
+Or from python:
+
+    import ingredients
+    ingredients.scrape_all()
+    ingredients.scrape_category('http://food.ndtv.com/ingredient/vegetables')
 """
 
+import argparse
 import json
-import requests
+from concurrent.futures import ThreadPoolExecutor
+
 from bs4 import BeautifulSoup
 
+import http_cache
+import rate_limit
+
 URL = 'http://food.ndtv.com/ingredient'
-page = requests.get(URL)
+# stop a category if a site bug keeps returning pages
+MAX_PAGES = 100
 
-soup = BeautifulSoup(page.content, 'html.parser')
 
-categories = []
+class ListingError(Exception):
+    """A listing page that is still failing after http_cache's retries"""
 
-# ingredient categories in following div
-results = soup.find(id ='video_listing')
-# category url and name in h3 headings
-heads = results.find_all('h3')
 
-# make list of tuple of categories and urls
-for h in heads:
-    categories.append(
-        (h.find(itemprop='name').text,
-         h.find('a')['href']))
+def get_listing(url):
+    """Get names and urls from the listing on a page
+    Return an empty list if the page has no listing,
+    raise ListingError if the page could not be fetched
+    """
+    page = http_cache.fetch(url)
+    if page.status_code != 200:
+        raise ListingError(f'{url} returned {page.status_code}')
+    soup = BeautifulSoup(page.content, 'html.parser')
+    # listing in following div
+    results = soup.find(id='video_listing')
+    if results is None:
+        return []
+    # url and name in h3 headings
+    return [(h.find(itemprop='name').text, h.find('a')['href'])
+            for h in results.find_all('h3')]
 
-# ingedients is a dictionary of categories
-ingredients = {c[0]: [] for c in categories}
 
-# get category pages
-for c in categories:
-    print(c[0])
-    # get first page
-    page = requests.get(c[1])
-    soup = BeautifulSoup(page.content, 'html.parser')
-    # page numbers in following div
-    results = soup.find(id='inside_pagination')
-    # pages in span elements
-    try:
-        pages = results.find_all('span', class_='pagination')
-        # count number of page numbers from text of links
-        pages = len([p.find('a').text for p in pages])
-    except:
-        pages = 1
-
-    for page in range(pages):
-        print(f'Getting page {page + 1}')
-        try:
-            page = requests.get(f'{c[1]}/page-{page+1}')
-        except:
-            print(f'Last page of category {c[0]}')
+def get_categories():
+    """Get list of tuple of categories and urls"""
+    return get_listing(URL)
+
+
+def scrape_category(url):
+    """Get ingredient names of a category
+    Get pages until one has no ingredients,
+    a page that fails is an error, not the end of the category
+    """
+    ingredients = []
+    for page in range(1, MAX_PAGES + 1):
+        # urls would be in the second item of each listing tuple
+        names = [name for name, _ in get_listing(f'{url}/page-{page}')]
+        if not names:
+            print(f'Last page of category {url} is {page - 1}')
             break
+        ingredients.extend(names)
+    return ingredients
+
 
-        soup = BeautifulSoup(page.content, 'html.parser')
+def scrape_all(workers=8):
+    """Get dictionary of categories of ingredients
+    Categories are scraped in parallel
+    """
+    categories = get_categories()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(scrape_category, [c[1] for c in categories])
+        # ingredients is a dictionary of categories
+        return {c[0]: result for c, result in zip(categories, results)}
 
-        # ingredients in following div
-        results = soup.find(id ='video_listing')
-        # ingredient url and name in h3 headings
-        heads = results.find_all('h3')
 
-        # make list of ingredients
-        # urls would be in h.find('a')['href']
-        for h in heads:
-            ingredients[c[0]].append(h.find(itemprop='name').text)
+def parse_args():
+    """Get command line options"""
+    parser = argparse.ArgumentParser(description='Scrape ingredients')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='number of categories scraped in parallel')
+    parser.add_argument('--output', default='ingredients.json',
+                        help='json file for ingredients')
+    return parser.parse_args()
 
-with open('ingredients.json', 'w') as f:
-    json.dump(ingredients, f)
 
-print(ingredients)
\ No newline at end of file
+if __name__ == '__main__':
+    args = parse_args()
+    ingredients = scrape_all(args.workers)
+    with open(args.output, 'w') as f:
+        json.dump(ingredients, f)
+    print(ingredients)
+    print(f'HTTP cache: {dict(http_cache.get_cache().stats)}')
+    print(f'Rate limits: {rate_limit.get_scheduler().summary()}')
@@ -1,13 +1,149 @@
-import json
+"""Search for ingredients
+Search ingredients.json with a trigram index so misspelt queries
+still find ingredients, e.g. zuchini finds Zucchini.
 
-with open('ingredients.json') as f:
-    ingredients = json.load(f)
+The index is saved to ingredients.idx and rebuilt when
+ingredients.json changes. Ingredients can also come from a corpus store,
+see fridge.corpus_store.
 
-i = 0
-for category in ingredients:
-    i += len(ingredients[category])
-    #print(category, ingredients[category])
+Search interactively:
+    python process_ingredients.py
+Or answer a file, or stdin, of queries one per line:
+    python process_ingredients.py --batch queries.txt
+    python process_ingredients.py --batch - < queries.txt
+"""
 
-ingredient = input(f'Search for an ingredient from {i} ingredients: ')
-print(f'{ingredient} could be {[i for c, v in ingredients.items() for i in v if ingredient.strip().lower() in i.lower()]}')
+import argparse
+import collections
+import os
+import pickle
+import sys
 
+from fridge.corpus import load_ingredients
+
+INGREDIENTS_PATH = 'ingredients.json'
+INDEX_PATH = 'ingredients.idx'
+# change when the saved index format changes
+INDEX_VERSION = 2
+
+
+def trigrams(text):
+    """Get set of three letter substrings of text
+    Padding lets the start and end of a word count
+    """
+    padded = f'  {text.strip().lower()} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Index of ingredient names by trigram"""
+
+    def __init__(self, ingredients):
+        # entries are (name, category), ids are positions in this list
+        self.entries = [(name, category)
+                        for category, names in ingredients.items()
+                        for name in names]
+        self.postings = collections.defaultdict(list)
+        for entry_id, (name, _) in enumerate(self.entries):
+            for gram in trigrams(name):
+                self.postings[gram].append(entry_id)
+        # plain dict pickles smaller and lookups of missing grams are cheap
+        self.postings = dict(self.postings)
+        # trigrams in more names than this say little about a match
+        self.max_posting = max(1000, len(self.entries) // 50)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, query, limit=10, min_score=0.3):
+        """Get up to limit (name, category, score) best matching query
+        Score is trigram similarity, names containing the query score 1 more
+        """
+        query = query.strip().lower()
+        grams = trigrams(query)
+        if not query:
+            return []
+        postings = sorted((self.postings.get(gram, ()) for gram in grams),
+                          key=len)
+        # candidates share the rarer trigrams, keep the two rarest anyway
+        rare = [p for p in postings if len(p) <= self.max_posting]
+        shared = collections.Counter()
+        for posting in rare or postings[:2]:
+            shared.update(posting)
+        # score only the names sharing most trigrams
+        results = []
+        for entry_id, _ in shared.most_common(limit * 5):
+            name, category = self.entries[entry_id]
+            name_grams = trigrams(name)
+            score = 2 * len(grams & name_grams) / (len(grams) + len(name_grams))
+            if query in name.lower():
+                score += 1
+            if score >= min_score:
+                results.append((name, category, round(score, 3)))
+        results.sort(key=lambda result: (-result[2], result[0]))
+        return results[:limit]
+
+    def save(self, path, source_mtime):
+        """Save index with the modification time of its source"""
+        with open(path, 'wb') as f:
+            pickle.dump((INDEX_VERSION, source_mtime, vars(self)), f,
+                        pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_state(cls, state):
+        """Get index from saved attributes without rebuilding it"""
+        index = cls.__new__(cls)
+        vars(index).update(state)
+        return index
+
+
+def load_index(ingredients_path=INGREDIENTS_PATH, index_path=INDEX_PATH):
+    """Get saved index, building it if missing or out of date"""
+    source_mtime = os.path.getmtime(ingredients_path)
+    try:
+        with open(index_path, 'rb') as f:
+            version, mtime, state = pickle.load(f)
+        if version == INDEX_VERSION and mtime == source_mtime:
+            return TrigramIndex.from_state(state)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+    index = TrigramIndex(load_ingredients(ingredients_path))
+    index.save(index_path, source_mtime)
+    return index
+
+
+def answer(index, query):
+    """Get answer line for a query"""
+    names = [result[0] for result in index.search(query)]
+    return f'{query.strip()} could be {names}'
+
+
+def answer_all(index, queries):
+    """Get answer lines for queries one per line, skipping blank lines"""
+    for query in queries:
+        if query.strip():
+            yield answer(index, query)
+
+
+def parse_args():
+    """Get command line options"""
+    parser = argparse.ArgumentParser(description='Search for ingredients')
+    parser.add_argument('--batch', metavar='FILE',
+                        help='answer queries from a file, - for stdin')
+    parser.add_argument('--ingredients', default=INGREDIENTS_PATH)
+    parser.add_argument('--index', default=INDEX_PATH)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    index = load_index(args.ingredients, args.index)
+    if args.batch:
+        queries = sys.stdin if args.batch == '-' else open(args.batch)
+        with queries:
+            for line in answer_all(index, queries):
+                print(line)
+    else:
+        ingredient = input(
+            f'Search for an ingredient from {len(index)} ingredients: ')
+        print(answer(index, ingredient))
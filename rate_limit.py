@@ -0,0 +1,210 @@
+"""Adaptive per-host rate limiting for the scrapers
+Every request to a host waits for a slot of that host's HostLimiter:
+    a token from a bucket refilled at the host's rate in requests a second
+    a place under the host's concurrency limit of requests in flight
+
+Both limits adapt to how the host copes, additive increase and
+multiplicative decrease like TCP congestion control:
+    a fast success adds about 1 request a second to the rate a second,
+        and 1 to the concurrency each time every place has been used
+    a 429, a 5xx, a failed request or a latency several times the
+        fastest seen halves both, once for the requests in flight then
+so the crawl settles near the fastest rate each site tolerates.
+Until the first decrease a success adds 1 to both instead, doubling
+them every second or round trip, so a new host is not slow to start.
+A Retry-After header stops every request to the host until it passes.
+
+The workers and max in flight options of the scrapers are upper bounds,
+threads wait here until their host has a slot.
+SCRAPE_MAX_RATE caps the rate of every host, 20 requests a second
+unless set.
+"""
+
+import collections
+import email.utils
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+
+START_RATE = 2.0
+MIN_RATE = 0.2
+MAX_RATE = float(os.environ.get('SCRAPE_MAX_RATE', 20))
+START_CONCURRENCY = 2.0
+MIN_CONCURRENCY = 1.0
+MAX_CONCURRENCY = 32.0
+# seconds of requests at the current rate the bucket can hold
+BURST_SECONDS = 1.0
+# requests a second added to the rate each second of fast successes
+RATE_STEP = 1.0
+# factor applied to both limits on a throttled or slow request
+DECREASE = 0.5
+# a request is slow when its latency is over the fastest seen times
+# LATENCY_FACTOR plus LATENCY_SLACK seconds, slack hides jitter
+LATENCY_FACTOR = 3.0
+LATENCY_SLACK = 0.05
+# how quickly the fastest latency seen moves towards current latencies,
+# so one lucky request does not make every later one look slow
+BASELINE_DRIFT = 0.01
+# longest Retry-After honoured, in seconds
+MAX_RETRY_AFTER = 300.0
+
+
+def is_throttled(status_code):
+    """Whether a response status asks to slow down, None is a failure"""
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def retry_after_seconds(value):
+    """Get seconds to wait from a Retry-After header, None if unusable
+    The header is either seconds or an HTTP date
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class HostLimiter:
+    """Token bucket and AIMD concurrency limit of one host
+    clock is time.monotonic, tests pass one they move on by hand
+    """
+
+    def __init__(self, rate=START_RATE, concurrency=START_CONCURRENCY,
+                 clock=time.monotonic):
+        self.clock = clock
+        self.rate = rate
+        self.concurrency = concurrency
+        self.tokens = 1.0
+        self.in_flight = 0
+        # times of clock
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.fastest = None
+        self.slow_start = True
+        self.stats = collections.Counter()
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = min(capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Wait for a slot, return its start time to pass to release"""
+        with self._condition:
+            while True:
+                now = self.clock()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    # a release notifies
+                    wait = None
+                elif self.tokens < 1.0:
+                    wait = (1.0 - self.tokens) / self.rate
+                else:
+                    break
+                self._condition.wait(wait)
+            self.tokens -= 1.0
+            self.in_flight += 1
+            return now
+
+    def release(self, start, status_code=None, retry_after=None):
+        """Free the slot started at start and adapt the limits
+        status_code is None for a request that failed without a response,
+        retry_after is the Retry-After header of the response
+        """
+        with self._condition:
+            now = self.clock()
+            self.in_flight -= 1
+            latency = now - start
+            seconds = retry_after_seconds(retry_after)
+            if seconds:
+                self.blocked_until = max(self.blocked_until, now + seconds)
+            slow = False
+            if is_throttled(status_code):
+                self.stats['throttled'] += 1
+            elif self.fastest is None or latency < self.fastest:
+                self.fastest = latency
+            else:
+                slow = latency > self.fastest * LATENCY_FACTOR + LATENCY_SLACK
+                self.fastest += (latency - self.fastest) * BASELINE_DRIFT
+            if is_throttled(status_code) or slow:
+                # requests sent before the last decrease saw the old
+                # limits, they do not decrease again
+                if start >= self.last_decrease:
+                    self._decrease(now)
+            else:
+                self._increase()
+            self._condition.notify_all()
+
+    def _decrease(self, now):
+        self.stats['decreases'] += 1
+        self.rate = max(MIN_RATE, self.rate * DECREASE)
+        self.concurrency = max(MIN_CONCURRENCY, self.concurrency * DECREASE)
+        self.tokens = min(self.tokens, 1.0)
+        self.last_decrease = now
+        self.slow_start = False
+
+    def _increase(self):
+        if self.slow_start:
+            rate_step, concurrency_step = RATE_STEP, 1.0
+        else:
+            # about rate successes a second,
+            # and concurrency successes a round trip
+            rate_step = RATE_STEP / self.rate
+            concurrency_step = 1.0 / self.concurrency
+        self.rate = min(MAX_RATE, self.rate + rate_step)
+        self.concurrency = min(MAX_CONCURRENCY,
+                               self.concurrency + concurrency_step)
+
+    def summary(self):
+        """Get dictionary of the current limits and counts"""
+        with self._condition:
+            return {'rate': round(self.rate, 2),
+                    'concurrency': int(self.concurrency), **self.stats}
+
+
+class Scheduler:
+    """HostLimiter of every host"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, url):
+        """Get the limiter of the host of a url"""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostLimiter(clock=self.clock)
+            return self.hosts[host]
+
+    def summary(self):
+        """Get dictionary of host: limits and counts"""
+        with self._lock:
+            hosts = dict(self.hosts)
+        return {host: limiter.summary() for host, limiter in hosts.items()}
+
+
+_scheduler = Scheduler()
+
+
+def get_scheduler():
+    """Get the scheduler shared by every scraper in this process"""
+    return _scheduler
@@ -0,0 +1,135 @@
+"""Streaming recipe output
+Recipes are appended one json record per line as they are scraped:
+    {"name": ..., "category": [...], "ingredients": [...], "url": ...}
+
+Records go to numbered segment files in an output directory.
+The segment being written ends in .open and is flushed after each record.
+When it is full it is renamed to .jsonl, so a .jsonl segment is always
+complete and can be read while the crawl is still running,
+with fridge.corpus.iter_recipes.
+
+A segment left open by a crash is completed when the sink is reopened.
+
+A page is crawled once, so a recipe listed under several categories is
+written with the first category path the crawl reached it by.
+The path of every later link to a page goes to listings.jsonl:
+    {"url": ..., "category": [...]}
+dedup_recipes.py merges them into the recipe records.
+"""
+
+import glob
+import json
+import os
+
+
+SEGMENT_SIZE = 1000
+
+
+def segment_paths(directory):
+    """Get completed segment paths in order"""
+    return sorted(glob.glob(os.path.join(directory, 'recipes-*.jsonl')))
+
+
+def listings_path(directory):
+    return os.path.join(directory, 'listings.jsonl')
+
+
+def iter_listings(directory):
+    """Get (url, category path) of later links to pages"""
+    try:
+        f = open(listings_path(directory), encoding='utf8')
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            listing = json.loads(line)
+            yield listing['url'], listing['category']
+
+
+def truncate_partial_line(path):
+    """Drop a record cut short by a crash from the end of a file
+    Return True if any complete records are left
+    """
+    with open(path, 'rb+') as f:
+        data = f.read()
+        f.truncate(data.rfind(b'\n') + 1)
+        return data.rfind(b'\n') >= 0
+
+
+class RecipeSink:
+    """Append recipe records to rotating jsonl segments"""
+
+    def __init__(self, directory='recipes', segment_size=SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        os.makedirs(directory, exist_ok=True)
+        self.count = 0
+        self._file = None
+        self._records = 0
+        self._recover()
+        self._segment = self._last_segment()
+        self._listings = None
+
+    def _last_segment(self):
+        """Get the number of the last completed segment"""
+        paths = segment_paths(self.directory)
+        if not paths:
+            return 0
+        return int(os.path.basename(paths[-1])[len('recipes-'):-len('.jsonl')])
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f'recipes-{segment:06d}.jsonl')
+
+    def _recover(self):
+        """Complete segments left open by an interrupted crawl"""
+        for open_path in glob.glob(os.path.join(self.directory, '*.open')):
+            if truncate_partial_line(open_path):
+                os.replace(open_path, open_path[:-len('.open')])
+            else:
+                os.remove(open_path)
+        if os.path.exists(listings_path(self.directory)):
+            truncate_partial_line(listings_path(self.directory))
+
+    def write(self, record):
+        """Append a record, rotating the segment when it is full"""
+        if self._file is None:
+            self._segment += 1
+            self._file = open(self._path(self._segment) + '.open', 'w',
+                              encoding='utf8')
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        self._records += 1
+        self.count += 1
+        if self._records >= self.segment_size:
+            self.rotate()
+
+    def write_listing(self, url, path):
+        """Append the category path of a later link to a page"""
+        if self._listings is None:
+            self._listings = open(listings_path(self.directory), 'a',
+                                  encoding='utf8')
+        self._listings.write(json.dumps({'url': url, 'category': path}) + '\n')
+        self._listings.flush()
+
+    def rotate(self):
+        """Complete the open segment"""
+        if self._file is None:
+            return
+        os.fsync(self._file.fileno())
+        self._file.close()
+        path = self._path(self._segment)
+        os.replace(path + '.open', path)
+        self._file = None
+        self._records = 0
+
+    def close(self):
+        self.rotate()
+        if self._listings is not None:
+            self._listings.close()
+            self._listings = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,32 +1,103 @@
-"""Make a dictionary of recipes
+"""Make a collection of recipes
 Scrape deliaonline.com
-Store recipies in a dictionary of lists arranged by categories
+Stream recipes with their category path to jsonl segments in recipes/
 
-Uses a recursive scraping strategy:
+Uses a frontier scraping strategy:
 
-Load a page
-If it is the data we are looking for:
-    Scrape it and return
-Get the number of pages
-Loop through the pages:
-    Loop through items on page:
-        Call itself
+Add the category page to the frontier
+Loop until the frontier is empty:
+    Load a page from the frontier
+    If it is the data we are looking for:
+        Scrape it
+    Otherwise:
+        Add its other pages and the items on it to the frontier
+
+The frontier skips pages it has already seen and is checkpointed to
+crawl_state.json, so an interrupted crawl resumes where it stopped.
+Pages that failed are kept in it, run again to retry them.
+Recipes scraped since the last checkpoint are written again on resume.
+
+A concurrent mode crawls the same frontier with a pool of asyncio workers
+sharing a queue of pages still to fetch. Blocking fetches run in a thread
+pool and a semaphore caps the number of requests in flight:
+
+    python recipies.py --concurrent --workers 16 --max-in-flight 8
+
+Max in flight is an upper bound, the site's adaptive rate limit decides
+how many requests are in flight, see rate_limit.py
+
+--fast-parse only builds the parts of a page the scraper reads,
+with lxml if it is installed, see requirements.txt. Without lxml it falls
+back to the built in parser and gains less, see benchmarks/bench_parse.py
+
+A recipe listed under several categories is written once, with the
+first category path, later paths to it go to listings.jsonl in recipes/.
+--dedup merges them and any duplicate recipes into another directory
+after the crawl:
+
+    python recipies.py --dedup recipes-dedup
 """
 
-import json
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import asyncio
+import collections
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import dedup_recipes
+import http_cache
+import rate_limit
+from crawl_frontier import Frontier, normalize_url
+from recipe_sink import RecipeSink
 
 
 SITE_URL = 'http://deliaonline.com'
 # page with categories of dish
 CATEGORY_URL = f'{SITE_URL}/recipes/type-of-dish'
 
+# fast parse only builds the parts of a page the scraper reads
+FAST_PARSE = False
+TARGET_CLASSES = [
+    'field-name-field-ingredient-groups',  # recipe ingredients
+    'recipe-information',  # recipe name
+    'term-listing-content',  # categories on a listing page
+    'pager-current',  # number of pages of a listing
+]
+# match elements with any of the target classes among their classes
+TARGET_STRAINER = SoupStrainer(class_=re.compile(
+    r'(?:^|\s)(?:' + '|'.join(TARGET_CLASSES) + r')(?:\s|$)'))
+
+
+def get_fast_parser():
+    """Get the fastest parser installed
+    lxml is an optional requirement, fall back to the built in parser
+    """
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return 'html.parser'
+    return 'lxml'
+
+
+def parse_page(content, fast=False):
+    """Get a soup for page content
+    Fast parse uses the fastest parser and only builds target regions
+    """
+    if fast:
+        return BeautifulSoup(content, get_fast_parser(),
+                             parse_only=TARGET_STRAINER)
+    return BeautifulSoup(content, 'html.parser')
+
 
 def get_soup(url):
-    """Get a soup for a url"""
-    page = requests.get(url)
-    soup = BeautifulSoup(page.content, 'html.parser')
+    """Get a soup for a url
+    Pages come through the on disk http cache
+    """
+    page = http_cache.fetch(url)
+    soup = parse_page(page.content, FAST_PARSE)
     return soup
 
 
@@ -77,41 +148,162 @@ def get_target_data(soup):
     return name, ingredients
 
 
-def recursive_scrape(page):
-    """ Recursive scrape function
-    Load the page
+def get_page_urls(page, pages):
+    """Get urls of the other pages of a listing
+    Listing pages after the first are at ?page=1, ?page=2...
+    """
+    # only the first page of a listing links to the rest
+    if 'page=' in urlsplit(page).query:
+        return []
+    separator = '&' if urlsplit(page).query else '?'
+    return [f'{page}{separator}page={n}' for n in range(1, pages)]
+
+
+def scrape_page(page, soup, path, sink):
+    """Scrape a page with its category path
     If it is the data we are looking for:
-        Scrape it and return
-    Get the number of pages
-    Loop through the pages:
-        Loop through items on page:
-            Call itself
+        Write it to the sink and return no links
+    Otherwise return links to its categories and its other pages
+    with the category path of each link
     """
-    print(f'Getting page {page}')
-    # get soup of page
-    soup = get_soup(page)
     if is_target_data(soup):
         print('Recipe page')
         name, ingredients = get_target_data(soup)
-        recipes['name'] = ingredients
-        print(name, recipes['name'])
-        return
-    # get number of pages
-    pages = get_number_of_pages(soup)
-    # loop through the pages
-    for new_page in range(pages):
-        categories = get_categories(soup)
-        for category in categories:
-            recursive_scrape(SITE_URL + category[1])
-    return
-
-
-# recipe has name as key and category list, ingredients, method as entry
-# e.g A mixed grill with apricot barbecue glaze:
-#   ['barbecue and outdoor food', 'barbecue meat and fish', 'mixed grill']
-#   ['6 xxx', '2 large xxx, ...']
-#   'Begin by ...'
-recipes = {}
-recursive_scrape(CATEGORY_URL)
-with open('recipes.json', 'w') as f:
-    json.dump(recipes, f)
+        path = dedup_recipes.recipe_path(path, name)
+        sink.write({'name': name, 'category': path,
+                    'ingredients': ingredients, 'url': page})
+        print(name, ingredients)
+        return []
+    links = [(urljoin(page, category[1]), path + [category[0].strip()])
+             for category in get_categories(soup)]
+    pages = get_page_urls(page, get_number_of_pages(soup))
+    return links + [(url, path) for url in pages]
+
+
+def add_links(frontier, links, sink, enqueue):
+    """Add links to the frontier and enqueue the new ones
+    The category path of a link to a page already seen is written
+    to the sink's listings, so no path of a recipe is lost
+    """
+    for link, path in links:
+        new = frontier.add(link, path)
+        if new:
+            enqueue(new)
+        else:
+            sink.write_listing(normalize_url(link), path)
+
+
+def recursive_scrape(frontier, sink):
+    """ Scrape function
+    Take pages from the frontier until it is empty
+    Add links from each page to the frontier
+    Pages already in the frontier or crawled are not added again
+    """
+    queue = collections.deque(frontier.pending)
+    while queue:
+        page = queue.popleft()
+        print(f'Getting page {page}')
+        try:
+            links = scrape_page(page, get_soup(page), frontier.pending[page],
+                                sink)
+            add_links(frontier, links, sink, queue.append)
+        except Exception as e:
+            # one bad page should not stop the crawl,
+            # it is left pending so a resumed crawl retries it
+            print(f'Failed to scrape {page}: {e}')
+        else:
+            frontier.complete(page)
+
+
+async def crawl_worker(queue, frontier, sink, limiter, executor):
+    """Take pages from the shared queue until cancelled
+    Links from each page not already in the frontier are added to the queue
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        page = await queue.get()
+        try:
+            print(f'Getting page {page}')
+            # only max in flight fetches run at the same time
+            async with limiter:
+                soup = await loop.run_in_executor(executor, get_soup, page)
+            links = scrape_page(page, soup, frontier.pending[page], sink)
+            add_links(frontier, links, sink, queue.put_nowait)
+        except Exception as e:
+            # one bad page should not stop the crawl,
+            # it is left pending so a resumed crawl retries it
+            print(f'Failed to scrape {page}: {e}')
+        else:
+            frontier.complete(page)
+        finally:
+            queue.task_done()
+
+
+async def concurrent_scrape(frontier, sink, workers=8, max_in_flight=8):
+    """Concurrent scrape function
+    Crawl the frontier with a pool of workers sharing a queue of pages
+    Return when the queue is empty and no worker is busy
+    """
+    queue = asyncio.Queue()
+    for page in frontier.pending:
+        queue.put_nowait(page)
+    limiter = asyncio.Semaphore(max_in_flight)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        tasks = [asyncio.ensure_future(
+                    crawl_worker(queue, frontier, sink, limiter, executor))
+                 for _ in range(workers)]
+        # wait until every queued page has been processed
+        await queue.join()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def parse_args():
+    """Get command line options"""
+    parser = argparse.ArgumentParser(description='Scrape recipes')
+    parser.add_argument('--concurrent', action='store_true',
+                        help='crawl with a pool of concurrent workers')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='number of concurrent workers')
+    parser.add_argument('--max-in-flight', type=int, default=8,
+                        help='maximum number of requests in flight')
+    parser.add_argument('--fast-parse', action='store_true',
+                        help='only parse the regions of a page that are read')
+    parser.add_argument('--output', default='recipes',
+                        help='directory for recipe jsonl segments')
+    parser.add_argument('--segment-size', type=int, default=1000,
+                        help='number of recipes in each segment')
+    parser.add_argument('--state', default='crawl_state.json',
+                        help='checkpoint file to resume an interrupted crawl')
+    parser.add_argument('--checkpoint-every', type=int, default=50,
+                        help='number of pages between checkpoints')
+    parser.add_argument('--dedup', metavar='DIRECTORY',
+                        help='merge duplicate recipes into this directory')
+    return parser.parse_args()
+
+
+# each recipe is a record with name, category path, ingredients and url
+# e.g {'name': 'A mixed grill with apricot barbecue glaze',
+#      'category': ['barbecue and outdoor food', 'barbecue meat and fish'],
+#      'ingredients': ['6 xxx', '2 large xxx, ...'],
+#      'url': 'http://deliaonline.com/recipes/...'}
+if __name__ == '__main__':
+    args = parse_args()
+    FAST_PARSE = args.fast_parse
+    frontier = Frontier(args.state, args.checkpoint_every)
+    # frontier data is the category path to each page
+    if not frontier.resume():
+        frontier.add(CATEGORY_URL, [])
+    with RecipeSink(args.output, args.segment_size) as sink:
+        if args.concurrent:
+            asyncio.run(concurrent_scrape(
+                frontier, sink, args.workers, args.max_in_flight))
+        else:
+            recursive_scrape(frontier, sink)
+    print(f'Wrote {sink.count} recipes to {args.output}')
+    frontier.finish()
+    if args.dedup:
+        dedup_recipes.main(args.output, args.dedup, args.segment_size)
+    print(f'HTTP cache: {dict(http_cache.get_cache().stats)}')
+    print(f'Rate limits: {rate_limit.get_scheduler().summary()}')
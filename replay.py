@@ -0,0 +1,157 @@
+"""Record and replay scraped pages
+Record mode saves every page the scrapers fetch to an archive:
+
+    SCRAPE_RECORD_DIR=archive python recipies.py
+
+Replay mode serves the archive from a local http server standing in for
+the real sites, with optional latency and injected errors:
+
+    python replay.py archive --port 8765 --latency 0.05 --error-rate 0.01
+    SCRAPE_REPLAY_URL=http://127.0.0.1:8765 python recipies.py
+
+The server maps /<host>/<path> to the recorded http://<host>/<path>.
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit
+
+
+class Archive:
+    """Pages saved by url in a directory
+    index.jsonl has a line per page, bodies are in separate files
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+        self.index_path = os.path.join(directory, 'index.jsonl')
+        self._lock = threading.Lock()
+
+    def save(self, url, status_code, content):
+        """Save a page, a later save of the same url replaces it"""
+        name = hashlib.sha256(url.encode('utf8')).hexdigest() + '.html'
+        with open(os.path.join(self.directory, 'bodies', name), 'wb') as f:
+            f.write(content)
+        entry = {'url': url, 'status_code': status_code, 'file': name}
+        with self._lock, open(self.index_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def load(self):
+        """Get dictionary of url: (status code, body file path)"""
+        pages = {}
+        with open(self.index_path) as f:
+            for line in f:
+                entry = json.loads(line)
+                pages[entry['url']] = (
+                    entry['status_code'],
+                    os.path.join(self.directory, 'bodies', entry['file']))
+        return pages
+
+
+def to_replay_url(url, replay_url):
+    """Get the replay server url for a site url"""
+    parts = urlsplit(url)
+    path = f'/{parts.netloc}{parts.path}'
+    if parts.query:
+        path += f'?{parts.query}'
+    return replay_url.rstrip('/') + path
+
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+    """Local stand in for the scraped sites"""
+
+    daemon_threads = True
+
+    def __init__(self, archive, port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, seed=None):
+        super().__init__(('127.0.0.1', port), ReplayHandler)
+        self.pages = archive.load()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats = collections.Counter()
+        self.stats_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Serve recorded pages"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+        # simulated round trip to the real site
+        delay = server.latency + server.random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        if server.random.random() < server.error_rate:
+            server.count('errors')
+            return self.reply(503, b'Injected error')
+        site_url = self.path.lstrip('/')
+        for scheme in ('http', 'https'):
+            page = server.pages.get(f'{scheme}://{site_url}')
+            if page:
+                break
+        else:
+            server.count('missing')
+            return self.reply(404, b'Not recorded')
+        status_code, body_path = page
+        with open(body_path, 'rb') as f:
+            self.reply(status_code, f.read())
+
+    def reply(self, status_code, body):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # one line per request would swamp benchmark output
+        pass
+
+
+def parse_args():
+    """Get command line options"""
+    parser = argparse.ArgumentParser(description='Replay recorded pages')
+    parser.add_argument('archive', help='directory of recorded pages')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='up to this many random seconds added')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for reproducible jitter and errors')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    server = ReplayServer(Archive(args.archive), args.port, args.latency,
+                          args.jitter, args.error_rate, args.seed)
+    print(f'Replaying {len(server.pages)} pages at {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(dict(server.stats))
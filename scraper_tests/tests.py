@@ -0,0 +1,774 @@
+"""Unit tests for the scrapers and their crawl pipeline
+Run with: python manage.py test scraper_tests
+or without django: python -m unittest scraper_tests.tests
+"""
+
+import asyncio
+import collections
+import email.utils
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase, mock
+
+import requests
+from bs4 import BeautifulSoup
+
+import dedup_recipes
+import http_cache
+import ingredients
+import process_ingredients
+import rate_limit
+import recipies
+import replay
+from crawl_frontier import Frontier, normalize_url
+from fridge.corpus import iter_recipes
+from http_cache import HttpCache, Page
+from recipe_sink import RecipeSink, iter_listings, segment_paths
+
+
+def recipe(name, ingredients, category=(), url=None):
+    return {'name': name, 'category': list(category),
+            'ingredients': ingredients, 'url': url}
+
+
+class DedupTest(TestCase):
+
+    def setUp(self):
+        self.lines = ['2 large onions', '1 oz butter', '1 pint milk',
+                      '2 cloves garlic', '4 oz cheddar cheese', '1 bay leaf']
+
+    def test_equal_sets_have_equal_signatures(self):
+        hasher = dedup_recipes.MinHasher()
+        self.assertEqual(hasher.signature({'onion', 'milk'}),
+                         hasher.signature({'milk', 'onion'}))
+        self.assertEqual(len(hasher.signature({'onion'})),
+                         dedup_recipes.BANDS * dedup_recipes.ROWS)
+
+    def test_signatures_estimate_jaccard_similarity(self):
+        hasher = dedup_recipes.MinHasher(permutations=512)
+        a = {f'ingredient {i}' for i in range(40)}
+        b = {f'ingredient {i}' for i in range(10, 50)}
+        same = sum(x == y for x, y in zip(hasher.signature(a),
+                                           hasher.signature(b)))
+        # jaccard similarity is 30 / 50
+        self.assertAlmostEqual(same / 512, 0.6, delta=0.1)
+
+    def test_union_find_names_groups_by_smallest_id(self):
+        groups = dedup_recipes.UnionFind(5)
+        groups.union(3, 4)
+        groups.union(4, 1)
+        self.assertEqual([groups.find(i) for i in range(5)], [0, 1, 2, 1, 1])
+
+    def test_finds_duplicates_after_an_unlike_bucket_member(self):
+        records = [recipe('Beef stew', self.lines),
+                   recipe('Onion tart', self.lines),
+                   recipe('Onion tart', list(reversed(self.lines)))]
+        groups = dedup_recipes.find_duplicates(records)
+        self.assertNotEqual(groups.find(0), groups.find(1))
+        self.assertEqual(groups.find(1), groups.find(2))
+
+    @mock.patch('dedup_recipes.MAX_REPRESENTATIVES', 5)
+    def test_caps_comparisons_in_a_bucket_of_common_sets(self):
+        words = ['broth', 'dip', 'glaze', 'gravy', 'hash', 'pie', 'ragout',
+                 'relish', 'roast', 'salad', 'sauce', 'soup', 'stew',
+                 'tart', 'toast']
+        lines = ['1 tsp salt', 'black pepper']
+        records = [recipe(f'{first} {second}', lines)
+                   for first in words[:5] for second in words[5:]]
+        records.append(recipe(records[2]['name'], lines))
+        with mock.patch('dedup_recipes.jaccard',
+                        wraps=dedup_recipes.jaccard) as jaccard:
+            groups = dedup_recipes.find_duplicates(records)
+        # every set is the same so they share every band, each member
+        # is compared with at most 5 others, not with all 50
+        self.assertLessEqual(jaccard.call_count,
+                             dedup_recipes.BANDS * len(records) * 5 * 2)
+        self.assertEqual(groups.find(len(records) - 1), 2)
+        self.assertEqual(len({groups.find(i) for i in range(len(records))}),
+                         len(records) - 1)
+
+    def test_merges_category_paths_of_duplicates(self):
+        records = [
+            recipe('Onion tart', self.lines, ['Tarts'],
+                   'http://deliaonline.com/recipes/onion-tart'),
+            recipe('Pea soup', ['1 lb peas'], ['Soups']),
+            recipe('Onion tart', self.lines, ['Seasons', 'Winter'],
+                   'http://deliaonline.com/recipes/onion-tart/')]
+        self.assertEqual(dedup_recipes.dedup(records), [
+            dict(records[0], categories=[['Tarts'], ['Seasons', 'Winter']]),
+            records[1]])
+
+    def test_merges_listing_paths_by_url(self):
+        url = 'http://deliaonline.com/recipes/onion-tart'
+        merged, = dedup_recipes.dedup(
+            [recipe('Onion tart', self.lines, ['Tarts'], url)],
+            {url: [['Vegetarian', 'Onion tart'], ['Tarts', 'Onion tart']]})
+        self.assertEqual(merged['category'], ['Tarts'])
+        self.assertEqual(merged['categories'], [['Tarts'], ['Vegetarian']])
+
+
+class FrontierTest(TestCase):
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.state_path = os.path.join(work_dir.name, 'crawl.json')
+
+    def test_normalizes_urls(self):
+        self.assertEqual(normalize_url('HTTP://Site.com:80/a/?b=2&a=1#top'),
+                         'http://site.com/a?a=1&b=2')
+        self.assertEqual(normalize_url('https://site.com:8443'),
+                         'https://site.com:8443/')
+
+    def test_adds_each_url_once(self):
+        frontier = Frontier()
+        self.assertEqual(frontier.add('http://site.com/a/', ['A']),
+                         'http://site.com/a')
+        self.assertIsNone(frontier.add('http://SITE.com/a'))
+        frontier.complete('http://site.com/a')
+        self.assertIsNone(frontier.add('http://site.com/a#top'))
+        self.assertEqual(len(frontier), 0)
+
+    def test_resumes_from_last_checkpoint(self):
+        frontier = Frontier(self.state_path, checkpoint_every=2)
+        for page in 'abcd':
+            frontier.add(f'http://site.com/{page}', [page])
+        frontier.complete('http://site.com/a')
+        self.assertFalse(os.path.exists(self.state_path))
+        frontier.complete('http://site.com/b')
+        # completed after the checkpoint, so crawled again on resume
+        frontier.complete('http://site.com/c')
+
+        resumed = Frontier(self.state_path)
+        self.assertTrue(resumed.resume())
+        self.assertEqual(list(resumed.pending.items()),
+                         [('http://site.com/c', ['c']),
+                          ('http://site.com/d', ['d'])])
+        self.assertEqual(resumed.done,
+                         {'http://site.com/a', 'http://site.com/b'})
+
+    def test_finish_removes_state_once_nothing_is_pending(self):
+        frontier = Frontier(self.state_path)
+        self.assertFalse(frontier.resume())
+        frontier.add('http://site.com/a')
+        # a page that failed is still pending
+        frontier.finish()
+        self.assertTrue(Frontier(self.state_path).resume())
+        frontier.complete('http://site.com/a')
+        frontier.finish()
+        self.assertFalse(os.path.exists(self.state_path))
+        self.assertFalse(Frontier(self.state_path).resume())
+
+
+class RecipeSinkTest(TestCase):
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.directory = os.path.join(work_dir.name, 'recipes')
+        self.records = [recipe(f'Recipe {i}', ['1 egg']) for i in range(5)]
+
+    def segments(self):
+        return [os.path.basename(path)
+                for path in segment_paths(self.directory)]
+
+    def test_rotates_full_segments(self):
+        sink = RecipeSink(self.directory, segment_size=2)
+        for record in self.records:
+            sink.write(record)
+        # only full segments are readable while the crawl runs
+        self.assertEqual(self.segments(),
+                         ['recipes-000001.jsonl', 'recipes-000002.jsonl'])
+        self.assertEqual(list(iter_recipes(self.directory)), self.records[:4])
+        sink.close()
+        self.assertEqual(len(self.segments()), 3)
+        self.assertEqual(list(iter_recipes(self.directory)), self.records)
+
+    def test_completes_segment_left_open_by_a_crash(self):
+        sink = RecipeSink(self.directory, segment_size=10)
+        for record in self.records[:3]:
+            sink.write(record)
+        sink.write_listing('http://site.com/a', ['Tarts'])
+        # crash part way through writing the next records
+        sink._file.close()
+        sink._listings.close()
+        with open(sink._file.name, 'a') as f:
+            f.write('{"name": "Rec')
+        with open(sink._listings.name, 'a') as f:
+            f.write('{"url": "http://si')
+
+        with RecipeSink(self.directory, segment_size=10) as recovered:
+            recovered.write(self.records[3])
+        self.assertEqual(self.segments(),
+                         ['recipes-000001.jsonl', 'recipes-000002.jsonl'])
+        self.assertEqual(list(iter_recipes(self.directory)), self.records[:4])
+        self.assertEqual(list(iter_listings(self.directory)),
+                         [('http://site.com/a', ['Tarts'])])
+
+    def test_removes_open_segment_without_records(self):
+        os.makedirs(self.directory)
+        with open(os.path.join(self.directory,
+                               'recipes-000001.jsonl.open'), 'w') as f:
+            f.write('{"name": "Rec')
+        RecipeSink(self.directory).close()
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+def category_page(links):
+    items = ''.join(f'<h3><a href="{url}">{name}</a></h3>'
+                    for name, url in links)
+    return f'<div class="term-listing-content">{items}</div>'
+
+
+def recipe_page(name, ingredients):
+    items = ''.join(f'<li itemprop="recipeIngredient">{line}</li>'
+                    for line in ingredients)
+    return (f'<div class="recipe-information"><h1>{name}</h1></div>'
+            f'<div class="field-name-field-ingredient-groups">{items}</div>')
+
+
+# a small site, onion tart is listed under both categories
+SITE = {
+    recipies.CATEGORY_URL: category_page([('Soups', '/recipes/soups'),
+                                          ('Tarts', '/recipes/tarts')]),
+    'http://deliaonline.com/recipes/soups': category_page([
+        ('Pea soup', '/recipes/pea-soup'),
+        ('Onion tart', '/recipes/onion-tart')]),
+    'http://deliaonline.com/recipes/tarts': category_page([
+        ('Onion tart', '/recipes/onion-tart'),
+        ('Leek tart', '/recipes/leek-tart')]),
+    'http://deliaonline.com/recipes/pea-soup': recipe_page(
+        'Pea soup', ['1 lb peas', '1 pint stock']),
+    'http://deliaonline.com/recipes/onion-tart': recipe_page(
+        'Onion tart', ['2 large onions', '1 oz butter']),
+    'http://deliaonline.com/recipes/leek-tart': recipe_page(
+        'Leek tart', ['2 leeks']),
+}
+
+
+def concurrent_scrape(frontier, sink):
+    # a crawl that does not finish fails the test instead of hanging
+    asyncio.run(asyncio.wait_for(
+        recipies.concurrent_scrape(frontier, sink, workers=4,
+                                   max_in_flight=2), timeout=10))
+
+
+class CrawlTest(TestCase):
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.directory = os.path.join(work_dir.name, 'recipes')
+        self.state_path = os.path.join(work_dir.name, 'crawl.json')
+        self.broken = set()
+
+    def get_soup(self, url):
+        if url in self.broken:
+            raise ConnectionError(f'{url} is down')
+        return BeautifulSoup(SITE[url], 'html.parser')
+
+    def crawl(self, scrape=recipies.recursive_scrape):
+        """Crawl the site, resuming any earlier crawl
+        Return the frontier and the recipe names written
+        """
+        frontier = Frontier(self.state_path)
+        if not frontier.resume():
+            frontier.add(recipies.CATEGORY_URL, [])
+        with mock.patch('recipies.get_soup', self.get_soup), \
+                RecipeSink(self.directory) as sink:
+            scrape(frontier, sink)
+        frontier.finish()
+        return frontier, sorted(record['name'] for record
+                                in iter_recipes(self.directory))
+
+    def output(self):
+        """Get the sorted recipes and listings written"""
+        return (sorted(map(json.dumps, iter_recipes(self.directory))),
+                sorted(iter_listings(self.directory)))
+
+    def test_failed_page_is_retried_on_resume(self):
+        tarts = 'http://deliaonline.com/recipes/tarts'
+        self.broken.add(tarts)
+        frontier, names = self.crawl()
+        self.assertEqual(names, ['Onion tart', 'Pea soup'])
+        self.assertEqual(list(frontier.pending), [tarts])
+        self.assertTrue(os.path.exists(self.state_path))
+
+        self.broken.clear()
+        frontier, names = self.crawl()
+        self.assertEqual(names, ['Leek tart', 'Onion tart', 'Pea soup'])
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_writes_same_records_as_recursive_crawl(self):
+        self.crawl()
+        expected = self.output()
+        shutil.rmtree(self.directory)
+        frontier, names = self.crawl(concurrent_scrape)
+        self.assertEqual(self.output(), expected)
+        self.assertEqual(len(frontier), 0)
+        self.assertEqual(len(frontier.done), len(SITE))
+
+    def test_finishes_when_a_page_raises(self):
+        tarts = 'http://deliaonline.com/recipes/tarts'
+        self.broken.add(tarts)
+        frontier, names = self.crawl(concurrent_scrape)
+        self.assertEqual(names, ['Onion tart', 'Pea soup'])
+        self.assertEqual(list(frontier.pending), [tarts])
+
+
+class CategoryListingTest(TestCase):
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.directory = os.path.join(work_dir.name, 'recipes')
+
+    def test_keeps_paths_of_links_to_seen_pages(self):
+        url = 'http://deliaonline.com/recipes/onion-tart'
+        frontier = Frontier()
+        queue = collections.deque()
+        with RecipeSink(self.directory) as sink:
+            recipies.add_links(frontier, [(url, ['Tarts', 'Onion tart'])],
+                               sink, queue.append)
+            recipies.add_links(frontier,
+                               [(url + '/', ['Vegetarian', 'Onion tart'])],
+                               sink, queue.append)
+        self.assertEqual(list(queue), [url])
+        self.assertEqual(list(iter_listings(self.directory)),
+                         [(url, ['Vegetarian', 'Onion tart'])])
+
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                         'benchmarks', 'pages')
+
+
+def saved_page(name):
+    with open(os.path.join(PAGES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class ParsePageTest(TestCase):
+
+    def assert_fast_parse_reads_the_same(self):
+        listing = saved_page('listing.html')
+        full = recipies.parse_page(listing)
+        fast = recipies.parse_page(listing, fast=True)
+        self.assertEqual(recipies.get_categories(fast),
+                         recipies.get_categories(full))
+        self.assertEqual(recipies.get_number_of_pages(fast),
+                         recipies.get_number_of_pages(full))
+        self.assertFalse(recipies.is_target_data(fast))
+        # only target regions are built
+        self.assertIsNone(fast.find('title'))
+        recipe_page = saved_page('recipe.html')
+        self.assertEqual(
+            recipies.get_target_data(recipies.parse_page(recipe_page, True)),
+            recipies.get_target_data(recipies.parse_page(recipe_page)))
+
+    def test_fast_parse_with_fastest_parser(self):
+        with mock.patch('builtins.print'):
+            self.assert_fast_parse_reads_the_same()
+
+    def test_fast_parse_with_built_in_parser(self):
+        with mock.patch('builtins.print'), \
+                mock.patch.dict('sys.modules', {'lxml': None}):
+            self.assertEqual(recipies.get_fast_parser(), 'html.parser')
+            self.assert_fast_parse_reads_the_same()
+
+
+def listing_page(url, names, status_code=200):
+    items = ''.join(f'<h3><a href="{url}/{name}"><span itemprop="name">'
+                    f'{name}</span></a></h3>' for name in names)
+    return Page(url, status_code,
+                f'<div id="video_listing">{items}</div>'.encode(), False)
+
+
+class IngredientListingTest(TestCase):
+
+    url = 'http://food.ndtv.com/ingredient/vegetables'
+
+    def scrape(self, pages):
+        with mock.patch('http_cache.fetch', lambda url: pages[url]):
+            return ingredients.scrape_category(self.url)
+
+    def test_stops_at_page_without_listing(self):
+        self.assertEqual(self.scrape({
+            f'{self.url}/page-1': listing_page(self.url, ['Leek', 'Kale']),
+            f'{self.url}/page-2': listing_page(self.url, ['Okra']),
+            f'{self.url}/page-3': Page(self.url, 200, b'<p>No results</p>',
+                                       False),
+        }), ['Leek', 'Kale', 'Okra'])
+
+    def test_failing_page_is_an_error(self):
+        with self.assertRaises(ingredients.ListingError):
+            self.scrape({
+                f'{self.url}/page-1': listing_page(self.url, ['Leek']),
+                f'{self.url}/page-2': listing_page(self.url, [], 503),
+            })
+
+
+class Clock:
+    """Clock moved on by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def acquire(limiter, clock):
+    """Move the clock on to the limiter's next slot and take it"""
+    limiter._refill(clock())
+    if limiter.tokens < 1.0:
+        # past the slot, so acquire does not wait for a float error
+        clock.advance((1.0 - limiter.tokens) / limiter.rate + 1e-6)
+    clock.now = max(clock.now, limiter.blocked_until)
+    return limiter.acquire()
+
+
+class RetryAfterTest(TestCase):
+
+    def test_parses_seconds(self):
+        self.assertEqual(rate_limit.retry_after_seconds('120'), 120.0)
+        self.assertEqual(rate_limit.retry_after_seconds('-5'), 0.0)
+        self.assertEqual(rate_limit.retry_after_seconds('86400'),
+                         rate_limit.MAX_RETRY_AFTER)
+
+    def test_parses_http_dates(self):
+        now = datetime.now(timezone.utc)
+        soon = email.utils.format_datetime(now + timedelta(seconds=60),
+                                           usegmt=True)
+        self.assertAlmostEqual(rate_limit.retry_after_seconds(soon), 60,
+                               delta=2)
+        past = email.utils.format_datetime(now - timedelta(days=1),
+                                           usegmt=True)
+        self.assertEqual(rate_limit.retry_after_seconds(past), 0.0)
+
+    def test_ignores_unusable_values(self):
+        self.assertIsNone(rate_limit.retry_after_seconds(None))
+        self.assertIsNone(rate_limit.retry_after_seconds('soon'))
+
+
+class HostLimiterTest(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.limiter = rate_limit.HostLimiter(clock=self.clock)
+
+    def request(self, status_code=200, latency=0.01, retry_after=None):
+        start = acquire(self.limiter, self.clock)
+        self.clock.advance(latency)
+        self.limiter.release(start, status_code, retry_after)
+
+    def test_slow_start_adds_one_a_success(self):
+        self.request()
+        self.request()
+        self.assertEqual(self.limiter.rate, rate_limit.START_RATE + 2)
+        self.assertEqual(self.limiter.concurrency,
+                         rate_limit.START_CONCURRENCY + 2)
+
+    def test_throttling_halves_limits_once_for_requests_in_flight(self):
+        first = acquire(self.limiter, self.clock)
+        second = acquire(self.limiter, self.clock)
+        self.clock.advance(0.01)
+        self.limiter.release(first, 503)
+        self.limiter.release(second, 429)
+        self.assertEqual(self.limiter.rate, rate_limit.START_RATE / 2)
+        self.assertEqual(self.limiter.concurrency, rate_limit.MIN_CONCURRENCY)
+        self.assertFalse(self.limiter.slow_start)
+        self.assertEqual(self.limiter.stats,
+                         {'throttled': 2, 'decreases': 1})
+
+    def test_increase_is_additive_after_a_decrease(self):
+        self.limiter.rate = self.limiter.concurrency = 4.0
+        self.limiter.slow_start = False
+        self.request()
+        self.assertEqual(self.limiter.rate, 4.25)
+        self.assertEqual(self.limiter.concurrency, 4.25)
+
+    def test_slow_response_decreases(self):
+        self.request(latency=0.1)
+        rate = self.limiter.rate
+        self.request(latency=1.0)
+        self.assertEqual(self.limiter.rate, rate / 2)
+
+    def test_retry_after_blocks_host(self):
+        self.request(429, retry_after='5')
+        self.assertEqual(self.limiter.blocked_until, self.clock() + 5)
+
+    def test_settles_near_server_rate(self):
+        # server answers 429 to more than 10 requests a second
+        served = collections.deque()
+        successes = []
+        for _ in range(3000):
+            start = acquire(self.limiter, self.clock)
+            while served and served[0] <= start - 1:
+                served.popleft()
+            status_code = 429 if len(served) >= 10 else 200
+            served.append(start)
+            self.clock.advance(0.01)
+            self.limiter.release(start, status_code)
+            if status_code == 200:
+                successes.append(start)
+        last_minute = [t for t in successes if t > self.clock() - 60]
+        self.assertGreater(len(last_minute) / 60, 7)
+        self.assertLessEqual(self.limiter.rate, 11)
+
+
+class SchedulerTest(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.scheduler = rate_limit.Scheduler(clock=self.clock)
+
+    def test_one_limiter_a_host(self):
+        limiter = self.scheduler.limiter('http://deliaonline.com/recipes')
+        self.assertIs(self.scheduler.limiter('http://DeliaOnline.com/'),
+                      limiter)
+        self.assertIsNot(self.scheduler.limiter('http://food.ndtv.com/'),
+                         limiter)
+        self.assertIs(limiter.clock, self.clock)
+
+    def test_throttling_one_host_leaves_others(self):
+        delia = self.scheduler.limiter('http://deliaonline.com/')
+        ndtv = self.scheduler.limiter('http://food.ndtv.com/')
+        delia.release(acquire(delia, self.clock), 503, '30')
+        ndtv.release(acquire(ndtv, self.clock), 200)
+        self.assertEqual(self.scheduler.summary(), {
+            'deliaonline.com': {'rate': 1.0, 'concurrency': 1,
+                                'throttled': 1, 'decreases': 1},
+            'food.ndtv.com': {'rate': 3.0, 'concurrency': 3}})
+        self.assertEqual(ndtv.blocked_until, 0.0)
+
+
+class Response:
+    """Stub of a requests response"""
+
+    def __init__(self, status_code=200, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.ok = status_code < 400
+
+
+class Session:
+    """Stub of a requests session answering from a list of responses
+    An exception in the list is raised instead
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class Limiter:
+    """Stub of a HostLimiter that never waits"""
+
+    def __init__(self):
+        self.released = []
+
+    def acquire(self):
+        return 0.0
+
+    def release(self, start, status_code=None, retry_after=None):
+        self.released.append(status_code)
+
+
+class HttpCacheTest(TestCase):
+
+    url = 'http://deliaonline.com/recipes/pea-soup'
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.cache = HttpCache(os.path.join(work_dir.name, 'cache'),
+                               record_dir=None, replay_url=None)
+        self.limiter = Limiter()
+        scheduler = mock.Mock(limiter=lambda url: self.limiter)
+        patcher = mock.patch('rate_limit.get_scheduler',
+                             lambda: scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_revalidates_cached_page(self):
+        modified = 'Sat, 17 Oct 2026 10:00:00 GMT'
+        self.cache.session = Session(
+            Response(200, b'<h1>Pea soup</h1>',
+                     {'ETag': '"v1"', 'Last-Modified': modified}),
+            Response(304))
+        first = self.cache.fetch(self.url)
+        self.assertEqual(first, Page(self.url, 200, b'<h1>Pea soup</h1>',
+                                     False))
+        # the body comes from disk when the site answers 304
+        self.assertEqual(self.cache.fetch(self.url),
+                         first._replace(from_cache=True))
+        self.assertEqual(self.cache.session.requests, [
+            (self.url, {}),
+            (self.url, {'If-None-Match': '"v1"',
+                        'If-Modified-Since': modified})])
+        self.assertEqual(self.cache.stats,
+                         {'downloaded': 1, 'not_modified': 1})
+
+    def test_replaces_modified_page(self):
+        self.cache.session = Session(Response(200, b'old', {'ETag': '"v1"'}),
+                                     Response(200, b'new', {'ETag': '"v2"'}),
+                                     Response(304))
+        self.cache.fetch(self.url)
+        self.cache.fetch(self.url)
+        self.assertEqual(self.cache.fetch(self.url).content, b'new')
+        self.assertEqual(self.cache.session.requests[-1][1],
+                         {'If-None-Match': '"v2"'})
+
+    def test_retries_throttled_requests(self):
+        self.cache.session = Session(Response(503), Response(429),
+                                     Response(200, b'soup'))
+        self.assertEqual(self.cache.fetch(self.url).content, b'soup')
+        self.assertEqual(self.limiter.released, [503, 429, 200])
+        self.assertEqual(self.cache.stats['retried'], 2)
+
+    def test_gives_up_after_max_attempts(self):
+        attempts = http_cache.MAX_ATTEMPTS
+        self.cache.session = Session(*[Response(503)] * attempts)
+        page = self.cache.fetch(self.url)
+        self.assertEqual(page.status_code, 503)
+        self.assertEqual(len(self.cache.session.requests), attempts)
+        # an error page is never cached
+        self.assertEqual(self.cache._load(self.url), (None, None))
+
+        self.cache.session = Session(
+            *[requests.ConnectionError('refused')] * attempts)
+        with self.assertRaises(requests.ConnectionError):
+            self.cache.fetch(self.url)
+        self.assertEqual(self.limiter.released[-attempts:],
+                         [None] * attempts)
+
+
+class ReplayTest(TestCase):
+
+    url = 'http://deliaonline.com/recipes/pea-soup'
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = work_dir.name
+        self.archive_dir = os.path.join(work_dir.name, 'archive')
+        scheduler = mock.Mock(limiter=lambda url: Limiter())
+        patcher = mock.patch('rate_limit.get_scheduler', lambda: scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cache(self, name, **kwargs):
+        return HttpCache(os.path.join(self.work_dir, name),
+                         **{'record_dir': None, 'replay_url': None, **kwargs})
+
+    def serve(self):
+        server = replay.ReplayServer(replay.Archive(self.archive_dir))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_records_fetched_pages(self):
+        recorder = self.cache('record', record_dir=self.archive_dir)
+        recorder.session = Session(Response(200, b'old'),
+                                   Response(200, b'<h1>Pea soup</h1>'))
+        recorder.fetch(self.url)
+        # a later fetch of the url replaces its recording
+        recorder.fetch(self.url)
+        pages = replay.Archive(self.archive_dir).load()
+        self.assertEqual(list(pages), [self.url])
+        status_code, body_path = pages[self.url]
+        self.assertEqual(status_code, 200)
+        with open(body_path, 'rb') as f:
+            self.assertEqual(f.read(), b'<h1>Pea soup</h1>')
+
+    def test_maps_site_urls_to_the_server(self):
+        self.assertEqual(
+            replay.to_replay_url(self.url + '?page=2', 'http://127.0.0.1:80/'),
+            'http://127.0.0.1:80/deliaonline.com/recipes/pea-soup?page=2')
+
+    def test_replays_recorded_page(self):
+        recorder = self.cache('record', record_dir=self.archive_dir)
+        recorder.session = Session(Response(200, b'<h1>Pea soup</h1>'))
+        recorder.fetch(self.url)
+        server = self.serve()
+        replayer = self.cache('replay', replay_url=server.url)
+        self.assertEqual(replayer.fetch(self.url),
+                         Page(self.url, 200, b'<h1>Pea soup</h1>', False))
+        missing = replayer.fetch('http://deliaonline.com/recipes/onion-tart')
+        self.assertEqual((missing.status_code, missing.content),
+                         (404, b'Not recorded'))
+        self.assertEqual(server.stats, {'requests': 2, 'missing': 1})
+
+
+class IngredientSearchTest(TestCase):
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.ingredients_path = os.path.join(work_dir.name,
+                                             'ingredients.json')
+        self.index_path = os.path.join(work_dir.name, 'ingredients.idx')
+        self.write_ingredients({'Vegetables': ['Zucchini', 'Onion', 'Leek'],
+                                'Dairy': ['Cheddar Cheese']})
+
+    def write_ingredients(self, ingredients, mtime=1000000000):
+        with open(self.ingredients_path, 'w') as f:
+            json.dump(ingredients, f)
+        os.utime(self.ingredients_path, (mtime, mtime))
+
+    def load_index(self):
+        return process_ingredients.load_index(self.ingredients_path,
+                                              self.index_path)
+
+    def test_finds_misspelt_names(self):
+        index = self.load_index()
+        self.assertEqual(index.search('zuchini')[0][:2],
+                         ('Zucchini', 'Vegetables'))
+        # names containing the query score 1 more
+        (name, _, score), = index.search('cheese')
+        self.assertEqual(name, 'Cheddar Cheese')
+        self.assertGreater(score, 1)
+
+    def test_drops_matches_below_threshold(self):
+        index = self.load_index()
+        self.assertEqual(index.search('xylophone'), [])
+        self.assertEqual(index.search('   '), [])
+        self.assertEqual(index.search('leak', min_score=0.5), [])
+        self.assertEqual([name for name, *_ in index.search('leak')],
+                         ['Leek'])
+
+    def test_rebuilds_saved_index_when_ingredients_change(self):
+        self.assertEqual(len(self.load_index()), 4)
+        with mock.patch('process_ingredients.load_ingredients') as load:
+            self.assertEqual(len(self.load_index()), 4)
+        load.assert_not_called()
+        self.write_ingredients({'Vegetables': ['Zucchini', 'Okra']},
+                               mtime=1000000100)
+        index = self.load_index()
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.search('okra')[0][0], 'Okra')
+
+    def test_answers_batch_of_queries(self):
+        index = self.load_index()
+        self.assertEqual(
+            list(process_ingredients.answer_all(
+                index, ['zuchini\n', '\n', 'xylophone\n'])),
+            ["zuchini could be ['Zucchini']", 'xylophone could be []'])